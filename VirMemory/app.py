@@ -1,20 +1,84 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
 from flask_cors import CORS
+import contextlib
+import functools
+import itertools
+import json
+import os
 import re
-from business_logic.simulator import Simulator
+import secrets
+import tempfile
+from business_logic.checkpoint import Checkpoint
+from business_logic.cost_model import CostModel
+from business_logic.frame_allocation import REPLACEMENT_SCOPES, FRAME_ALLOCATORS
+from business_logic.jobs import JobManager, JobCancelled, JOB_CHUNK_SIZE
+from business_logic.sessions import SessionRegistry
+from business_logic.trace_file import ACCESS_TYPES, MAX_PROCESS_ID, convert_trace
+from business_logic.trace_reader import TRACE_FORMATS
+from business_logic.simulator import Simulator, TABLES, PAGE_TABLE_MODES, PAGE_REPLACEMENT_POLICIES, TLB_REPLACEMENT_POLICIES, TLB_INCLUSION_POLICIES, TLB_CONTEXT_MODES
 
 app = Flask(__name__)
 CORS(app)
 
-simulator = None
+# Every browser gets its own simulator, found by the session ID in its cookie
+sessions = SessionRegistry()
+SESSION_COOKIE = "vm_session"
+SESSION_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{16,64}")
+jobs = JobManager()
+# Traces uploaded to /jobs; converted to the binary format and memory-mapped, so only disk space limits them
+MAX_TRACE_UPLOAD_SIZE = 2 ** 30
+app.config["MAX_CONTENT_LENGTH"] = MAX_TRACE_UPLOAD_SIZE
+TRACE_SUFFIX_PATTERN = re.compile(r"(\.[A-Za-z0-9]{1,8}){1,2}$")  # kept for format detection, e.g. ".bin.gz"
+JOB_EVENT_KEEPALIVE = 15  # seconds between comments on an event stream without progress
+MAX_CHECKPOINTS = 10  # per session, oldest dropped first
+
+DEFAULT_PAGE_SIZE = 4096
+DEFAULT_MEMORY_SIZE = 64 * 1024
+DEFAULT_TLB_SIZE = 16
+MIN_PAGE_SIZE = 2 ** 10
+MAX_PAGE_SIZE = 2 ** 30
+MAX_MEMORY_SIZE = 2 ** 40
+MAX_TLB_SIZE = 4096
+MAX_VIRTUAL_ADDRESS_WIDTH = 48
+# Sequences entered by hand are short, so the web app defaults to a working-set window and
+# thrashing intervals of a few accesses instead of the simulator's defaults
+WEB_WORKING_SET_WINDOW = 10
+WEB_THRASHING_INTERVAL = 10
+# Tables are sent in windows of rows; generate_system sends the first window of each
+TABLE_WINDOW = 256
+MAX_TABLE_WINDOW = 8192
+# Memory the simulator itself needs: a byte per frame
+MAX_FRAMES = 2 ** 26
 
 @app.route("/")
 def index():
     return render_template("index.html")
 
+def session_id():
+    """The session ID from the request's cookie, or a new one that is set on the response."""
+    if "session_id" not in g:
+        cookie = request.cookies.get(SESSION_COOKIE, "")
+        g.session_id = cookie if SESSION_ID_PATTERN.fullmatch(cookie) else secrets.token_urlsafe(24)
+    return g.session_id
+
+@app.after_request
+def set_session_cookie(response):
+    if "session_id" in g and request.cookies.get(SESSION_COOKIE) != g.session_id:
+        response.set_cookie(SESSION_COOKIE, g.session_id, httponly=True, samesite="Lax")
+    return response
+
+def with_simulator(view):
+    """Run an endpoint with the session's simulator, holding the session's lock; error if it has none."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with sessions.use(session_id()) as session:
+            if session.simulator is None:
+                return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
+            return view(session.simulator, *args, **kwargs)
+    return wrapper
+
 @app.route("/generate_system", methods=["POST"])
 def generate_system():
-    global simulator
     data = request.json
 
     try:
@@ -33,30 +97,116 @@ def generate_system():
         except ValueError:
             return jsonify({"error": "TLB Associativity must be an integer."}), 400
         page_replacement_policy = data["page_replacement_policy"]
+        if page_replacement_policy not in PAGE_REPLACEMENT_POLICIES:
+            return jsonify({"error": f"Page Replacement Policy must be one of: {', '.join(PAGE_REPLACEMENT_POLICIES)}."}), 400
+
+        try:
+            working_set_window = int(data.get("working_set_window", WEB_WORKING_SET_WINDOW))
+        except ValueError:
+            return jsonify({"error": "Working Set Window must be an integer."}), 400
+        if working_set_window < 1:
+            return jsonify({"error": "Working Set Window must be at least one access."}), 400
+        replacement_scope = data.get("replacement_scope", "global")
+        if replacement_scope not in REPLACEMENT_SCOPES:
+            return jsonify({"error": f"Replacement Scope must be one of: {', '.join(REPLACEMENT_SCOPES)}."}), 400
+        frame_allocator = data.get("frame_allocator", "equal")
+        if frame_allocator not in FRAME_ALLOCATORS:
+            return jsonify({"error": f"Frame Quotas must be one of: {', '.join(FRAME_ALLOCATORS)}."}), 400
+
+        try:
+            page_size = int(data.get("page_size", DEFAULT_PAGE_SIZE))
+            memory_size = int(data.get("memory_size", DEFAULT_MEMORY_SIZE))
+            tlb_size = int(data.get("tlb_size", DEFAULT_TLB_SIZE))
+            l2_tlb_size = int(data.get("l2_tlb_size", 0))
+            l2_tlb_associativity = int(data.get("l2_tlb_associativity", 4))
+            itlb_size = int(data.get("itlb_size", 0))
+        except ValueError:
+            return jsonify({"error": "Page Size, Physical Memory and TLB sizes must be integers."}), 400
+        page_table_mode = data.get("page_table_mode")
+        if page_table_mode is not None and page_table_mode not in PAGE_TABLE_MODES:
+            return jsonify({"error": f"Page Table Mode must be one of: {', '.join(PAGE_TABLE_MODES)}."}), 400
+        tlb_policy = data.get("tlb_policy", "FIFO")
+        if tlb_policy not in TLB_REPLACEMENT_POLICIES:
+            return jsonify({"error": f"TLB Replacement Policy must be one of: {', '.join(TLB_REPLACEMENT_POLICIES)}."}), 400
+        tlb_inclusion = data.get("tlb_inclusion", "inclusive")
+        if tlb_inclusion not in TLB_INCLUSION_POLICIES:
+            return jsonify({"error": f"TLB Inclusion must be one of: {', '.join(TLB_INCLUSION_POLICIES)}."}), 400
+        tlb_context_mode = data.get("tlb_context_mode", "asid")
+        if tlb_context_mode not in TLB_CONTEXT_MODES:
+            return jsonify({"error": f"TLB Context Switch Mode must be one of: {', '.join(TLB_CONTEXT_MODES)}."}), 400
+
+        if not is_power_of_two(page_size) or page_size < MIN_PAGE_SIZE or page_size > MAX_PAGE_SIZE:
+            return jsonify({"error": "Page Size must be a power of 2 between 1 KB and 1 GB."}), 400
+        if memory_size < page_size or memory_size % page_size != 0 or memory_size > MAX_MEMORY_SIZE:
+            return jsonify({"error": "Physical Memory must be a multiple of the Page Size and at most 1 TB."}), 400
+        if memory_size // page_size > MAX_FRAMES:
+            return jsonify({"error": f"Physical Memory must have at most {MAX_FRAMES} frames."}), 400
+        if not is_power_of_two(tlb_size) or tlb_size > MAX_TLB_SIZE:
+            return jsonify({"error": f"TLB Size must be a power of 2 and at most {MAX_TLB_SIZE} entries."}), 400
+
+        page_shift = page_size.bit_length() - 1
+        if virtual_address_width < page_shift or virtual_address_width > MAX_VIRTUAL_ADDRESS_WIDTH:
+            return jsonify({"error": f"Virtual Address Width must be between {page_shift} and {MAX_VIRTUAL_ADDRESS_WIDTH} bits."}), 400
+        if not is_power_of_two(tlb_associativity) or tlb_associativity > tlb_size:
+            return jsonify({"error": "TLB Associativity must be a power of 2 no larger than the TLB Size."}), 400
+        if l2_tlb_size and (not is_power_of_two(l2_tlb_size) or l2_tlb_size > MAX_TLB_SIZE):
+            return jsonify({"error": f"L2 TLB Size must be 0 or a power of 2 of at most {MAX_TLB_SIZE} entries."}), 400
+        if l2_tlb_size and (not is_power_of_two(l2_tlb_associativity) or l2_tlb_associativity > l2_tlb_size):
+            return jsonify({"error": "L2 TLB Associativity must be a power of 2 no larger than the L2 TLB Size."}), 400
+        if itlb_size and (not is_power_of_two(itlb_size) or itlb_size > MAX_TLB_SIZE):
+            return jsonify({"error": f"L1 Instruction TLB Size must be 0 or a power of 2 of at most {MAX_TLB_SIZE} entries."}), 400
+
+        cost_model = data.get("cost_model") or {}
+        if not isinstance(cost_model, dict) or set(cost_model) - set(CostModel().to_dict()):
+            return jsonify({"error": f"Cost Model may only set: {', '.join(CostModel().to_dict())}."}), 400
+        try:
+            cost_model = CostModel(**{name: int(value) for name, value in cost_model.items()})
+        except ValueError:
+            return jsonify({"error": "Cost Model latencies must be non-negative integers."}), 400
 
-        if virtual_address_width < 12 or virtual_address_width > 25:
-            return jsonify({"error": "Virtual Address Width must be between 12 and 25 bits."}), 400
-        if tlb_associativity <= 0 or not (tlb_associativity & (tlb_associativity - 1)) == 0 or tlb_associativity >16:
-            return jsonify({"error": "TLB Associativity must be a positive integer smaller than 16 and a power of 2."}), 400
-
-        simulator = Simulator(
-            policy=page_replacement_policy,
-            vas=virtual_address_width,
-            associativity=tlb_associativity
-        )
-        vas_table = simulator.generate_vas_table()
-        pt_table = simulator.generate_page_table()
-        ram_table = simulator.generate_ram_table()
-        tlb_table = simulator.generate_tlb_table()
+        try:
+            simulator = Simulator(
+                policy=page_replacement_policy,
+                vas=virtual_address_width,
+                associativity=tlb_associativity,
+                pageSize=page_size,
+                memorySize=memory_size,
+                tlbSize=tlb_size,
+                pageTableMode=page_table_mode,
+                tlbPolicy=tlb_policy,
+                l2TlbSize=l2_tlb_size,
+                l2TlbAssociativity=l2_tlb_associativity,
+                tlbInclusion=tlb_inclusion,
+                itlbSize=itlb_size,
+                costModel=cost_model,
+                tlbContextMode=tlb_context_mode,
+                replacementScope=replacement_scope,
+                frameAllocator=frame_allocator,
+                workingSetWindow=working_set_window,
+                thrashingInterval=WEB_THRASHING_INTERVAL
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        with sessions.use(session_id()) as session:
+            session.simulator = simulator
+            vas_table = simulator.generate_vas_table(0, TABLE_WINDOW)
+            pt_table = simulator.generate_page_table(0, TABLE_WINDOW)
+            ram_table = simulator.generate_ram_table(0, TABLE_WINDOW)
+            tlb_table = simulator.generate_tlb_table()
+            itlb_table = simulator.generate_tlb_table("itlb")
+            table_sizes = {table: simulator.table_size(table) for table in TABLES}
 
         return jsonify({
             "message": "System successfully generated.",
+            "version": simulator.version,
             "tables": {
                 "vas": vas_table,
                 "page_table": pt_table,
                 "ram": ram_table,
-                "tlb": tlb_table
-            }
+                "tlb": tlb_table,
+                "itlb": itlb_table
+            },
+            "table_sizes": table_sizes
         })
 
     except TypeError as e:
@@ -67,18 +217,15 @@ def generate_system():
 @app.route("/reset_system", methods=["POST"])
 def reset_system():
     """API endpoint to reset the system."""
-    global simulator
-    simulator = None
+    with sessions.use(session_id()) as session:
+        session.simulator = None
     return jsonify({
         "message": "System reset successfully."
     })
 
 @app.route("/upload_address_sequence", methods=["POST"])
-def upload_address_sequence():
-    global simulator
-    if not simulator:
-        return jsonify({"error": "Simulator not initialized. Generate the system first."}), 400
-
+@with_simulator
+def upload_address_sequence(simulator):
     try:
         for _ in range(10):
             simulator.generate_random_address()
@@ -94,70 +241,310 @@ def upload_address_sequence():
 
 
 @app.route("/add_address", methods=["POST"])
-def add_address():
-    global simulator
-    if not simulator:
-        return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
-
+@with_simulator
+def add_address(simulator):
     data = request.json
     try:
         address = data["address"]
-        if not validate_memory_address(address):
+        if not validate_memory_address(simulator, address):
             return jsonify({"error": "Invalid address."}), 400
-        simulator.add_memory_address(address)
+        access_type = data.get("access_type", "R")
+        if access_type not in ACCESS_TYPES:
+            return jsonify({"error": f"Access Type must be one of: {', '.join(ACCESS_TYPES)}."}), 400
+        try:
+            process_id = int(data.get("process_id", simulator.currentPid))
+        except ValueError:
+            return jsonify({"error": "Process ID must be an integer."}), 400
+        if not 0 <= process_id <= MAX_PROCESS_ID:
+            return jsonify({"error": f"Process ID must be between 0 and {MAX_PROCESS_ID}."}), 400
+        simulator.add_memory_address(address, ACCESS_TYPES[access_type], process_id)
         formatted_sequence = simulator.display_address_sequence()
         return jsonify({"sequence": formatted_sequence})
     except KeyError:
         return jsonify({"error": "Missing address in request."}), 400
 
 @app.route("/generate_random_address", methods=["POST"])
-def generate_random_address():
-    global simulator
-    if simulator is None:
-        return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
-
+@with_simulator
+def generate_random_address(simulator):
     simulator.generate_random_address()
     formatted_sequence = simulator.display_address_sequence()
     return jsonify({"sequence": formatted_sequence})
 
 @app.route("/next_step", methods=["POST"])
-def next_step():
-    global simulator
-    if simulator is None:
-        return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
-
+@with_simulator
+def next_step(simulator):
+    since, error = requested_version()
+    if error:
+        return error
     messages = simulator.process_next_step()
-    stats = get_statistics()
-    formatted_sequence = simulator.display_address_sequence()
-    pt_table = simulator.generate_page_table()
-    tlb_table = simulator.generate_tlb_table()
-
-    response = {"messages": messages, "stats": stats, "sequence": formatted_sequence, "colors": simulator.color_state,
-                "page_table": pt_table,"tlb_table": tlb_table}
-    print(response)
-    return jsonify(response), 200
+    return step_response(simulator, messages, since), 200
 
 @app.route("/next_address", methods=["POST"])
-def next_address():
-    global simulator
-    if not simulator:
-        return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
-
+@with_simulator
+def next_address(simulator):
+    since, error = requested_version()
+    if error:
+        return error
     messages = simulator.process_next_address()
-    stats = get_statistics()
-    formatted_sequence = simulator.display_address_sequence()
-    pt_table = simulator.generate_page_table()
-    tlb_table = simulator.generate_tlb_table()
+    return step_response(simulator, messages, since)
+
+@app.route("/snapshot", methods=["GET"])
+@with_simulator
+def snapshot(simulator):
+    """TLB, colors and sequence at the current version, for clients that lost track."""
+    return jsonify(dict(simulator.snapshot(), stats=get_statistics(simulator)))
+
+@app.route("/tables/<table>", methods=["GET"])
+@with_simulator
+def table_window(simulator, table):
+    """
+    Rows start to start + count of a table (vas, page_table, ram or tlb), or with valid=1 the next
+    count valid page table entries from start. "next" is where the following window starts.
+    """
+    if table not in TABLES:
+        return jsonify({"error": f"Table must be one of: {', '.join(TABLES)}."}), 404
+
+    try:
+        start = int(request.args.get("start", 0))
+        count = int(request.args.get("count", TABLE_WINDOW))
+    except ValueError:
+        return jsonify({"error": "Start and Count must be integers."}), 400
+    if start < 0 or not 1 <= count <= MAX_TABLE_WINDOW:
+        return jsonify({"error": f"Start must not be negative and Count must be between 1 and {MAX_TABLE_WINDOW}."}), 400
+    valid_only = request.args.get("valid", "0").lower() in ("1", "true")
+    if valid_only and table != "page_table":
+        return jsonify({"error": "Only the page table can be filtered to valid entries."}), 400
+
+    # One row past the window tells whether there is more to come, and where
+    rows = list(itertools.islice(simulator.table_rows(table, start, validOnly=valid_only), count + 1))
+    following = rows.pop()["row"] if len(rows) > count else None
+    return jsonify({"table": table, "start": start, "size": simulator.table_size(table), "rows": rows,
+                    "next": following, "version": simulator.version})
+
+@app.route("/thrashing", methods=["GET"])
+@with_simulator
+def thrashing_window(simulator):
+    """Thrashing rows of intervals start to start + count (see Simulator.thrashing_stats)."""
+    try:
+        start = int(request.args.get("start", 0))
+        count = int(request.args.get("count", TABLE_WINDOW))
+    except ValueError:
+        return jsonify({"error": "Start and Count must be integers."}), 400
+    if start < 0 or not 1 <= count <= MAX_TABLE_WINDOW:
+        return jsonify({"error": f"Start must not be negative and Count must be between 1 and {MAX_TABLE_WINDOW}."}), 400
+
+    size = simulator.thrashing_interval_count()
+    return jsonify({"start": start, "size": size, "rows": simulator.thrashing_stats(start, start + count),
+                    "next": start + count if start + count < size else None})
+
+@app.route("/jobs", methods=["POST"])
+@with_simulator
+def start_job(simulator):
+    """
+    Run the rest of the address sequence in the background. A trace file uploaded as "trace" (any
+    format run_trace_file reads, or "format") is converted by the job, in a "converting" phase, and
+    becomes the sequence first; "count" limits the run.
+    """
+    owner = session_id()
+    if jobs.running(owner):
+        return jsonify({"error": "A job is already running for this session."}), 409
+
+    data = request.form if request.files else (request.get_json(silent=True) or {})
+    try:
+        count = None if data.get("count") in (None, "") else int(data["count"])
+    except (TypeError, ValueError):
+        return jsonify({"error": "Count must be an integer."}), 400
+    if count is not None and count < 1:
+        return jsonify({"error": "Count must be at least one address."}), 400
+    upload = request.files.get("trace")
+    if upload:
+        trace_format = data.get("format", "auto")
+        if trace_format not in TRACE_FORMATS:
+            return jsonify({"error": f"Trace Format must be one of: {', '.join(TRACE_FORMATS)}."}), 400
+        trace = (save_upload(upload), trace_format)
+        sessions.pin(owner)  # unpinned by run_job when it ends
+        job = jobs.start(owner, None, lambda job: run_job(job, owner, simulator, count, trace), "converting")
+        return jsonify(job.status()), 202
+
+    sessions.pin(owner)
+    job = jobs.start(owner, job_total(simulator, count), lambda job: run_job(job, owner, simulator, count))
+    return jsonify(job.status()), 202
+
+def save_upload(upload):
+    """Save an uploaded trace as it is to a temporary file, keeping its suffix for format detection."""
+    suffix = TRACE_SUFFIX_PATTERN.search(upload.filename or "")
+    fd, path = tempfile.mkstemp(suffix=suffix.group() if suffix else "")
+    os.close(fd)
+    upload.save(path)
+    return path
+
+def job_total(simulator, count):
+    remaining = len(simulator.addressSequence) - simulator.currentAddressIndex
+    return remaining if count is None else min(count, remaining)
+
+def load_uploaded_trace(job, owner, simulator, source, trace_format):
+    """
+    Convert a saved upload to the binary format and make it the address sequence, memory-mapped.
+    The conversion runs without the session's lock, reporting the addresses converted so far.
+    """
+    def converted(addresses):
+        if job.cancelled:
+            raise JobCancelled()
+        job.report(addresses, None, phase="converting")
+
+    fd, destination = tempfile.mkstemp(suffix=".vmt")
+    os.close(fd)
+    try:
+        try:
+            convert_trace(source, destination, trace_format, progress=converted)
+        except ValueError as e:
+            raise ValueError(f"Invalid trace: {e}")
+        with sessions.use(owner) as session:
+            if session.simulator is not simulator:
+                raise RuntimeError("The simulator was reset while the trace was being converted.")
+            simulator.load_trace_file(destination)
+    finally:
+        for path in (source, destination):
+            with contextlib.suppress(OSError):  # the mapping stays valid once the file is unlinked
+                os.unlink(path)
+
+def run_job(job, owner, simulator, count, trace=None):
+    """
+    Run a job's addresses chunk by chunk, after converting `trace` (path and format of an upload) if
+    given. The session is only locked for a chunk at a time, so its other requests get through
+    while the job runs, but it stays pinned so it is not evicted.
+    """
+    try:
+        if trace is not None:
+            load_uploaded_trace(job, owner, simulator, *trace)
+            with sessions.use(owner):
+                job.report(0, None, phase="running", total=job_total(simulator, count))
+        while job.done < job.total and not job.cancelled:
+            with sessions.use(owner) as session:
+                if session.simulator is not simulator:
+                    raise RuntimeError("The simulator was reset while the job was running.")
+                ran = simulator.run_sequence(min(JOB_CHUNK_SIZE, job.total - job.done))
+                stats = get_statistics(simulator)
+            if not ran:
+                break
+            job.report(job.done + ran, stats)
+        job.report(job.done, job.stats, "cancelled" if job.cancelled else "done")
+    finally:
+        sessions.unpin(owner)
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """State, progress and the latest statistics of a job; the final statistics once it is done."""
+    job = jobs.get(job_id, session_id())
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    return jsonify(job.status())
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Cancel a job; it stops after the chunk it is running, keeping the addresses already run."""
+    job = jobs.get(job_id, session_id())
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+    job.cancel()
+    return jsonify(job.status()), 202
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-sent events: a "progress" event with the job's status after every chunk, then one
+    "done", "cancelled" or "failed" event with the final status.
+    """
+    job = jobs.get(job_id, session_id())
+    if job is None:
+        return jsonify({"error": "Unknown job."}), 404
+
+    def events():
+        revision = -1
+        while True:
+            job.wait(revision, JOB_EVENT_KEEPALIVE)
+            status = job.status()
+            if status["state"] != "running":
+                yield f"event: {status['state']}\ndata: {json.dumps(status)}\n\n"
+                return
+            if status["revision"] == revision:
+                yield ": keep-alive\n\n"
+                continue
+            revision = status["revision"]
+            yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
 
-    return jsonify({"messages": messages, "stats": stats,"sequence": formatted_sequence, "colors": simulator.color_state,
-                    "page_table": pt_table,"tlb_table": tlb_table})
+@app.route("/checkpoints", methods=["POST"])
+def save_checkpoint():
+    """Checkpoint the session's simulator in memory, to restore or branch from later."""
+    with sessions.use(session_id()) as session:
+        if session.simulator is None:
+            return jsonify({"error": "Simulator not initialized. Please generate the system first."}), 400
+        checkpoint_id = secrets.token_urlsafe(8)
+        session.checkpoints[checkpoint_id] = Checkpoint(session.simulator)
+        while len(session.checkpoints) > MAX_CHECKPOINTS:
+            session.checkpoints.popitem(last=False)
+        return jsonify(checkpoint_info(checkpoint_id, session.checkpoints[checkpoint_id])), 201
 
-def get_statistics():
-    global simulator
-    if not simulator:
-        return jsonify({"error": "Simulator not initialized."}), 400
+@app.route("/checkpoints", methods=["GET"])
+def list_checkpoints():
+    with sessions.use(session_id()) as session:
+        return jsonify({"checkpoints": [checkpoint_info(checkpoint_id, checkpoint)
+                                        for checkpoint_id, checkpoint in session.checkpoints.items()]})
 
+@app.route("/checkpoints/<checkpoint_id>/restore", methods=["POST"])
+def restore_checkpoint(checkpoint_id):
+    """
+    Replace the session's simulator with a checkpoint's, continuing with another page replacement
+    policy if "policy" is given. The checkpoint is kept, so it can be branched from again.
+    """
+    data = request.get_json(silent=True) or {}
+    policy = data.get("policy") or None
+    if policy is not None and policy not in PAGE_REPLACEMENT_POLICIES:
+        return jsonify({"error": f"Page Replacement Policy must be one of: {', '.join(PAGE_REPLACEMENT_POLICIES)}."}), 400
+    with sessions.use(session_id()) as session:
+        checkpoint = session.checkpoints.get(checkpoint_id)
+        if checkpoint is None:
+            return jsonify({"error": "Unknown checkpoint."}), 404
+        simulator = checkpoint.restore()
+        if policy is not None:
+            simulator.change_page_replacement_policy(policy)
+        session.simulator = simulator
+        return jsonify(dict(simulator.snapshot(), stats=get_statistics(simulator)))
+
+def checkpoint_info(checkpoint_id, checkpoint):
+    return {"id": checkpoint_id, "address_index": checkpoint.addressIndex, "accesses": checkpoint.accesses,
+            "policy": checkpoint.policy, "size": len(checkpoint)}
+
+def requested_version():
+    """The version a step request's client holds ("since"), or None for a full response; plus an error response."""
+    data = request.get_json(silent=True) or {}
+    if data.get("since") is None:
+        return None, None
+    try:
+        return int(data["since"]), None
+    except (TypeError, ValueError):
+        return None, (jsonify({"error": "Version must be an integer."}), 400)
+
+def step_response(simulator, messages, since):
+    """
+    Response to a step: with a client version, only what changed since then (see Simulator.delta);
+    without one, the TLB and the first MAX_TABLE_WINDOW page table rows.
+    """
+    stats = get_statistics(simulator)
+    if since is not None:
+        return jsonify({"messages": messages, "stats": stats, "delta": simulator.delta(since)})
+
+    return jsonify({"messages": messages, "stats": stats, "sequence": simulator.display_address_sequence(),
+                    "colors": simulator.color_state, "page_table": simulator.generate_page_table(0, MAX_TABLE_WINDOW),
+                    "tlb_table": simulator.generate_tlb_table(), "itlb_table": simulator.generate_tlb_table("itlb"),
+                    "version": simulator.version})
+
+def get_statistics(simulator):
+    """Counters and rates of the run; the per-interval thrashing rows are served by /thrashing."""
     simulator.calculate_hit_rates()
+    counters = simulator.get_counters()
 
     stats = {
         "tlb_hits": simulator.tlbHit,
@@ -166,9 +553,22 @@ def get_statistics():
         "pt_hits": simulator.ptHit,
         "pt_misses": simulator.ptMiss,
         "pt_hit_rate": simulator.ptHitRate,
+        "write_backs": counters["writeBacks"],
+        "clean_evictions": counters["cleanEvictions"],
+        "context_switches": counters["contextSwitches"],
+        "tlb_flushed_entries": counters["tlbFlushedEntries"],
+        "processes": simulator.process_stats(),
+        "refaults": counters["refaults"],
+        "thrashing": simulator.thrashing_summary(),
+        "tlb_levels": simulator.tlb_level_stats(),
+        "page_sizes": simulator.page_size_stats(),
+        "cost": simulator.cost_stats(),
     }
     return stats
 
-def validate_memory_address(address):
+def is_power_of_two(value):
+    return value > 0 and value & (value - 1) == 0
+
+def validate_memory_address(simulator, address):
         if int(address,16) < 2 ** simulator.vasWidth:
             return True
@@ -0,0 +1,56 @@
+"""
+Resident memory of a 1M-entry page table in each layout.
+
+Run from the VirMemory directory:
+    python -m benchmarks.page_table_memory_benchmark
+"""
+import tracemalloc
+
+from models.page import Page, PageTable, SparsePageTable
+
+NUM_PAGES = 1 << 20
+
+
+class LegacyPage:
+    """The original per-page object: a __dict__ holding validBit, frame and index."""
+
+    def __init__(self, index: int):
+        self.validBit = False
+        self.frame = -1
+        self.index = index
+
+
+def measure(build):
+    """Return the bytes still allocated after `build()`, keeping its result alive."""
+    tracemalloc.start()
+    table = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del table
+    return size
+
+
+def build_sparse_full():
+    pageTable = SparsePageTable(NUM_PAGES, 4096)
+    for vpn in range(NUM_PAGES):
+        pageTable.map_page(vpn, vpn)
+    return pageTable
+
+
+def main():
+    layouts = [
+        ("list of Page objects (__dict__)", lambda: [LegacyPage(index=i) for i in range(NUM_PAGES)]),
+        ("list of Page objects (__slots__)", lambda: [Page(index=i) for i in range(NUM_PAGES)]),
+        ("sparse table, every VPN touched", build_sparse_full),
+        ("struct-of-arrays PageTable", lambda: PageTable(NUM_PAGES, 4096)),
+    ]
+    baseline = None
+    print(f"{'layout':<34} {'MB':>8} {'bytes/entry':>12} {'vs legacy':>10}")
+    for name, build in layouts:
+        size = measure(build)
+        baseline = baseline or size
+        print(f"{name:<34} {size / 2 ** 20:>8.1f} {size / NUM_PAGES:>12.1f} {baseline / size:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Microbenchmark for the page replacement policies.
+
+Fills a policy with `frames` resident pages, then measures the cost of an access
+to a resident page and of an eviction. Both should stay flat as the frame count grows.
+
+Run from the VirMemory directory:
+    python -m benchmarks.replacement_policy_benchmark
+"""
+import random
+import time
+
+from business_logic.replacement_policy import create_page_replacement_policy
+from models.frame_table import FrameTable
+from models.page import PageTable
+from models.tlb import TLB
+
+FRAME_COUNTS = [16, 256, 4096, 65536, 1 << 20]
+ACCESSES = 200_000
+EVICTIONS = 20_000
+
+
+ONLINE_POLICIES = ("FIFO", "LRU", "CLOCK", "SecondChance", "LFU", "ARC")  # OPT needs a whole trace
+
+
+def benchmark_policy(name, frames):
+    """Return (ns per access, ns per eviction) for a policy holding `frames` pages."""
+    policy = create_page_replacement_policy(name, frames)
+    pageTable = PageTable(frames, frames)
+    frameTable = FrameTable(frames)
+    tlb = TLB(16, 4)
+    for page in range(frames):
+        pageTable.map_page(page, frameTable.allocate())
+        policy.access_page(page)
+
+    rng = random.Random(0)
+    pattern = [rng.randrange(frames) for _ in range(ACCESSES)]
+    start = time.perf_counter()
+    for page in pattern:
+        policy.access_page(page)
+    accessCost = (time.perf_counter() - start) / ACCESSES * 1e9
+
+    evictions = min(EVICTIONS, frames)
+    start = time.perf_counter()
+    for _ in range(evictions):
+        policy.replace_page(pageTable, frameTable, tlb)
+    evictionCost = (time.perf_counter() - start) / evictions * 1e9
+    return accessCost, evictionCost
+
+
+def main():
+    print(f"{'policy':<12} {'frames':>9} {'access ns':>10} {'evict ns':>10}")
+    for name in ONLINE_POLICIES:
+        for frames in FRAME_COUNTS:
+            accessCost, evictionCost = benchmark_policy(name, frames)
+            print(f"{name:<12} {frames:>9} {accessCost:>10.0f} {evictionCost:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
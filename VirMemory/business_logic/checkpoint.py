@@ -0,0 +1,111 @@
+"""
+Checkpoints: the whole state of a Simulator saved as compact bytes, to resume later or branch from.
+
+A checkpoint is a header (magic and format version) followed by the zlib-compressed pickle of the
+simulator: page tables, TLBs, replacement policy state, frames, counters and the position in the
+address sequence. A memory-mapped trace is stored by its path and mapped again on restore, so
+the trace file must still exist then.
+
+Only load checkpoints you made yourself: unpickling can run arbitrary code.
+
+Forks and in-memory checkpoints share with their source what no simulator modifies in place (the
+memory-mapped trace and the next-use index of offline policies) instead of copying it.
+"""
+import io
+import pickle
+import struct
+import zlib
+
+CHECKPOINT_MAGIC = b"VMCK"
+CHECKPOINT_VERSION = 1
+HEADER = struct.Struct("<4sH")
+COMPRESSION_LEVEL = 6
+
+
+class CheckpointPickler(pickle.Pickler):
+    """Pickler that writes the objects of `shared` as references to be resolved on load."""
+
+    def __init__(self, file, shared=()):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.sharedIds = {id(obj): index for index, obj in enumerate(shared)}
+
+    def persistent_id(self, obj):
+        return self.sharedIds.get(id(obj))
+
+
+class CheckpointUnpickler(pickle.Unpickler):
+    def __init__(self, file, shared=()):
+        super().__init__(file)
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        return self.shared[pid]
+
+
+def shared_objects(simulator):
+    """The read-only objects of a simulator that a copy in the same process can share."""
+    shared = []
+    if not isinstance(simulator.addressSequence, list):
+        shared.append(simulator.addressSequence)
+    policies = [simulator.pageReplacementPolicy]
+    policies += [process.replacementPolicy for process in simulator.addressSpaces.processes.values()]
+    for policy in {id(policy): policy for policy in policies}.values():
+        if policy.offline:
+            shared.append(policy.nextUse)
+    shared += [pages for pages, _ in simulator.offlineTraces.values()]
+    return shared
+
+
+def dumps(simulator, shared=()):
+    """Checkpoint bytes of a simulator; objects in `shared` must be passed to loads again."""
+    buffer = io.BytesIO()
+    CheckpointPickler(buffer, shared).dump(simulator)
+    return HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION) + zlib.compress(buffer.getbuffer(), COMPRESSION_LEVEL)
+
+
+def loads(data, shared=()):
+    """Restore a simulator from checkpoint bytes."""
+    if len(data) < HEADER.size:
+        raise ValueError("Checkpoint is too short.")
+    magic, version = HEADER.unpack_from(data)
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("Not a simulator checkpoint.")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version: {version}")
+    return CheckpointUnpickler(io.BytesIO(zlib.decompress(memoryview(data)[HEADER.size:])), shared).load()
+
+
+def save_checkpoint(simulator, path):
+    with open(path, "wb") as f:
+        f.write(dumps(simulator))
+
+
+def load_checkpoint(path):
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def fork(simulator):
+    """An independent copy of a simulator, sharing its read-only objects."""
+    shared = shared_objects(simulator)
+    buffer = io.BytesIO()
+    CheckpointPickler(buffer, shared).dump(simulator)
+    buffer.seek(0)
+    return CheckpointUnpickler(buffer, shared).load()
+
+
+class Checkpoint:
+    """A checkpoint kept in memory, compressed, holding on to the objects it shares with the simulator."""
+
+    def __init__(self, simulator):
+        self.shared = shared_objects(simulator)
+        self.data = dumps(simulator, self.shared)
+        self.addressIndex = simulator.currentAddressIndex
+        self.accesses = simulator.tlbHit + simulator.tlbMiss
+        self.policy = simulator.policyName
+
+    def __len__(self):
+        return len(self.data)
+
+    def restore(self):
+        return loads(self.data, self.shared)
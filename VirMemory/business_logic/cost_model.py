@@ -0,0 +1,36 @@
+class CostModel:
+    """
+    Latencies, in cycles, used to turn the simulator's event counts into time.
+    Every access pays a lookup at each TLB level it reaches and one RAM access for the data;
+    a TLB miss adds a page walk reading `walkLevelCycles` per page table level, and a page
+    fault adds the fault service time. Evicting a dirty page adds a write-back to secondary memory.
+    """
+
+    def __init__(self, tlbCycles=1, l2TlbCycles=7, walkLevelCycles=100, ramCycles=100, pageFaultCycles=1_000_000,
+                 writeBackCycles=1_000_000):
+        self.tlbCycles = tlbCycles  # L1 TLB lookup (also the per-page-size huge page TLBs)
+        self.l2TlbCycles = l2TlbCycles
+        self.walkLevelCycles = walkLevelCycles
+        self.ramCycles = ramCycles
+        self.pageFaultCycles = pageFaultCycles
+        self.writeBackCycles = writeBackCycles
+        for name, value in self.to_dict().items():
+            if value < 0:
+                raise ValueError(f"Cost model latency {name} must not be negative.")
+
+    def tlb_lookup_cycles(self, level: str):
+        return self.l2TlbCycles if level == "L2" else self.tlbCycles
+
+    def to_dict(self):
+        return {
+            "tlbCycles": self.tlbCycles,
+            "l2TlbCycles": self.l2TlbCycles,
+            "walkLevelCycles": self.walkLevelCycles,
+            "ramCycles": self.ramCycles,
+            "pageFaultCycles": self.pageFaultCycles,
+            "writeBackCycles": self.writeBackCycles,
+        }
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value}" for name, value in self.to_dict().items())
+        return f"CostModel({fields})"
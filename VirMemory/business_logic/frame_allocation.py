@@ -0,0 +1,86 @@
+"""
+How processes share the frames of physical memory.
+
+Under global replacement every page competes with every other page, whichever process owns it.
+Under local replacement every process has a frame quota, set by a FrameAllocator: a process at
+its quota replaces one of its own pages, and when memory is full the frame is taken from the
+process that is furthest over its quota.
+"""
+from abc import ABC, abstractmethod
+
+REPLACEMENT_SCOPES = ("global", "local")
+# Page-fault-frequency bounds, in faults per access of the faulting process
+PFF_UPPER_FAULT_RATE = 0.1
+PFF_LOWER_FAULT_RATE = 0.01
+
+
+class FrameAllocator(ABC):
+    def __init__(self, numFrames: int):
+        self.numFrames = numFrames
+
+    def initial_quota(self, numProcesses):
+        """Quota of a process that starts next to `numProcesses - 1` others: an equal share."""
+        return max(1, self.numFrames // numProcesses)
+
+    @abstractmethod
+    def quota(self, process, numProcesses):
+        """
+        Frames `process` may hold while `numProcesses` processes exist.
+        """
+        pass
+
+    def page_fault(self, process, time):
+        """
+        Called on every page fault of `process`, `time` being its virtual time (accesses it made).
+        Returns True if its quota changed.
+        """
+        return False
+
+
+class EqualFrameAllocator(FrameAllocator):
+    """Every process gets the same share of memory, shrinking as more processes start."""
+
+    def quota(self, process, numProcesses):
+        return max(1, self.numFrames // numProcesses)
+
+
+class PFFFrameAllocator(FrameAllocator):
+    """
+    Page-fault-frequency allocation: a process that faults more often than `upperFaultRate` gets
+    one more frame, one that faults less often than `lowerFaultRate` gives one back.
+    """
+
+    def __init__(self, numFrames: int, upperFaultRate=PFF_UPPER_FAULT_RATE, lowerFaultRate=PFF_LOWER_FAULT_RATE):
+        super().__init__(numFrames)
+        if not 0 < lowerFaultRate < upperFaultRate <= 1:
+            raise ValueError("PFF fault rates must satisfy 0 < lower < upper <= 1.")
+        self.upperFaultRate = upperFaultRate
+        self.lowerFaultRate = lowerFaultRate
+
+    def quota(self, process, numProcesses):
+        return process.quota
+
+    def page_fault(self, process, time):
+        """Compare the time since the process's previous fault with the PFF bounds."""
+        interval = time - process.lastFaultTime
+        process.lastFaultTime = time
+        if interval * self.upperFaultRate < 1 and process.quota < self.numFrames:
+            process.quota += 1
+            return True
+        if interval * self.lowerFaultRate > 1 and process.quota > 1:
+            process.quota -= 1
+            return True
+        return False
+
+
+FRAME_ALLOCATORS = {
+    "equal": EqualFrameAllocator,
+    "pff": PFFFrameAllocator,
+}
+
+
+def create_frame_allocator(name, numFrames):
+    """Build a frame allocator by name for `numFrames` frames."""
+    if name not in FRAME_ALLOCATORS:
+        raise ValueError(f"Unknown frame allocator: {name}")
+    return FRAME_ALLOCATORS[name](numFrames)
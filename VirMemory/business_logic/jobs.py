@@ -0,0 +1,121 @@
+"""
+Background jobs: long runs that report progress while they work and can be cancelled.
+
+A job runs its work function in a thread of its own. The work calls Job.report after every chunk,
+which wakes up anyone waiting for progress (see Job.wait), and checks Job.cancelled between chunks.
+Work done in several phases, e.g. converting a trace before running it, reports the phase it is in.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+JOB_CHUNK_SIZE = 20000  # addresses run between progress reports and cancellation checks
+MAX_FINISHED_JOBS = 100  # finished jobs kept for their results, oldest dropped first
+JOB_STATES = ("running", "done", "cancelled", "failed")
+
+
+class JobCancelled(Exception):
+    """Raised by a job's work to stop at once; the job ends as cancelled."""
+
+
+class Job:
+    def __init__(self, owner, total, phase="running"):
+        self.jobId = secrets.token_urlsafe(12)
+        self.owner = owner  # only the session that started a job may see it
+        self.total = total  # work units to do in the current phase, e.g. addresses; None if not known yet
+        self.phase = phase
+        self.done = 0
+        self.state = "running"
+        self.stats = None  # latest progress snapshot, the final results once finished
+        self.error = None
+        self.started = time.monotonic()
+        self.finished = None
+        self.revision = 0  # bumped by every report, so waiters can tell whether they missed one
+        self.changed = threading.Condition()
+        self.cancelRequested = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancelRequested.is_set()
+
+    def cancel(self):
+        """Ask the job to stop after its current chunk."""
+        self.cancelRequested.set()
+
+    def report(self, done, stats, state="running", error=None, phase=None, total=None):
+        """Record progress; `phase` and `total` start a new phase of the work."""
+        with self.changed:
+            if phase is not None:
+                self.phase = phase
+                self.total = total
+            self.done = done
+            self.stats = stats
+            self.state = state
+            self.error = error
+            if state != "running":
+                self.finished = time.monotonic()
+            self.revision += 1
+            self.changed.notify_all()
+
+    def wait(self, revision, timeout=None):
+        """Block until there is a report newer than `revision`, the job is finished, or `timeout` passes."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.revision > revision or self.state != "running", timeout)
+
+    def status(self):
+        with self.changed:
+            end = self.finished or time.monotonic()
+            return {
+                "id": self.jobId,
+                "state": self.state,
+                "phase": self.phase,
+                "done": self.done,
+                "total": self.total,
+                "progress": None if self.total is None else self.done / self.total if self.total else 1.0,
+                "seconds": end - self.started,
+                "revision": self.revision,
+                "stats": self.stats,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    def __init__(self, maxFinishedJobs=MAX_FINISHED_JOBS):
+        self.maxFinishedJobs = maxFinishedJobs
+        self.jobs = OrderedDict()  # job ID -> Job, oldest first
+        self.lock = threading.Lock()
+
+    def start(self, owner, total, work, phase="running"):
+        """
+        Run `work(job)` in a background thread and return the job at once. Whatever the work raises
+        fails the job with that message, except JobCancelled, which cancels it.
+        """
+        job = Job(owner, total, phase)
+
+        def run():
+            try:
+                work(job)
+            except JobCancelled:
+                job.report(job.done, job.stats, "cancelled")
+            except Exception as e:
+                job.report(job.done, job.stats, "failed", str(e))
+
+        with self.lock:
+            self.jobs[job.jobId] = job
+            finished = [jobId for jobId, other in self.jobs.items() if other.state != "running"]
+            for jobId in finished[:max(0, len(finished) - self.maxFinishedJobs)]:
+                del self.jobs[jobId]
+        threading.Thread(target=run, name=f"job-{job.jobId}", daemon=True).start()
+        return job
+
+    def get(self, jobId, owner):
+        """The job with `jobId` if `owner` started it, else None."""
+        with self.lock:
+            job = self.jobs.get(jobId)
+        return job if job is not None and job.owner == owner else None
+
+    def running(self, owner):
+        """The job of `owner` that is still running, if any."""
+        with self.lock:
+            return next((job for job in self.jobs.values() if job.owner == owner and job.state == "running"), None)
@@ -1,7 +1,16 @@
+import heapq
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_WORKING_SET_WINDOW = 1000  # accesses a page stays in the working set after its last use
 
 
 class PageReplacementPolicy(ABC):
+    offline = False  # True if the policy needs the whole trace up front (see set_trace)
+    expires = False  # True if pages can leave memory before a frame is needed (see release_expired)
+
     @abstractmethod
     def replace_page(self, pageTable, frameTable, tlb):
         """
@@ -16,17 +25,44 @@ class PageReplacementPolicy(ABC):
         """
         pass
 
+    def prepare_replacement(self, pageIndex):
+        """
+        Called right before replace_page with the page that will take the freed frame.
+        Policies that adapt to the incoming page (ARC) override this.
+        """
+        pass
+
+    def set_trace(self, vpns, start=0):
+        """
+        Give an offline policy the page sequence it is about to see, from position `start` on.
+        """
+        pass
+
+    def release_expired(self, pageTable, frameTable, tlb):
+        """
+        Evict the pages that have left the policy's working set, even though no frame is needed yet.
+        Returns one replace_page result per evicted page; most policies keep pages until memory runs out.
+        """
+        return []
+
+    def resize(self, capacity):
+        """
+        Called when the number of frames the policy manages changes, e.g. a process's quota under
+        local replacement. Policies sized to their frames (ARC) override this.
+        """
+        pass
+
 
 class FIFOPageReplacementPolicy(PageReplacementPolicy):
     def __init__(self):
-        self.queue = []
+        self.queue = OrderedDict()  # pages in load order, O(1) membership and pop
 
     def access_page(self, pageIndex):
         """
         Add a page to the queue if it's not already in it.
         """
         if pageIndex not in self.queue:
-            self.queue.append(pageIndex)
+            self.queue[pageIndex] = None
 
     def replace_page(self, pageTable, frameTable, tlb):
         """
@@ -35,7 +71,7 @@ class FIFOPageReplacementPolicy(PageReplacementPolicy):
         if not self.queue:
             raise RuntimeError("FIFO queue is empty, no pages to replace.")
 
-        pageIndex = self.queue.pop(0)
+        pageIndex, _ = self.queue.popitem(last=False)
 
         tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
 
@@ -44,15 +80,16 @@ class FIFOPageReplacementPolicy(PageReplacementPolicy):
 
 class LRUPageReplacementPolicy(PageReplacementPolicy):
     def __init__(self):
-        self.recentPages = []
+        self.recentPages = OrderedDict()  # least recently used first
 
     def access_page(self, pageIndex):
         """
         Update the page access order. Move the accessed page to the most recent position.
         """
         if pageIndex in self.recentPages:
-            self.recentPages.remove(pageIndex)
-        self.recentPages.append(pageIndex)
+            self.recentPages.move_to_end(pageIndex)
+        else:
+            self.recentPages[pageIndex] = None
 
     def replace_page(self, pageTable, frameTable, tlb):
         """
@@ -61,8 +98,372 @@ class LRUPageReplacementPolicy(PageReplacementPolicy):
         if not self.recentPages:
             raise RuntimeError("LRU list is empty, no pages to replace.")
 
-        pageIndex = self.recentPages.pop(0)
+        pageIndex, _ = self.recentPages.popitem(last=False)
 
         tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
 
         return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class SecondChancePageReplacementPolicy(PageReplacementPolicy):
+    def __init__(self):
+        self.queue = OrderedDict()  # page -> referenced bit, in load order
+
+    def access_page(self, pageIndex):
+        """
+        Set the page's referenced bit, queueing it if it was just loaded.
+        """
+        self.queue[pageIndex] = True
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Evict the oldest page whose referenced bit is clear; referenced pages get their bit
+        cleared and go to the back of the queue.
+        """
+        if not self.queue:
+            raise RuntimeError("Second-chance queue is empty, no pages to replace.")
+
+        while True:
+            pageIndex, referenced = self.queue.popitem(last=False)
+            if not referenced:
+                break
+            self.queue[pageIndex] = False
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class ClockPageReplacementPolicy(PageReplacementPolicy):
+    def __init__(self):
+        self.ring = []  # resident pages in clock order, None for a slot freed by an eviction
+        self.slots = {}  # page -> index in ring
+        self.referenced = bytearray()  # referenced bit per ring slot
+        self.freeSlots = []
+        self.hand = 0
+
+    def access_page(self, pageIndex):
+        """
+        Set the page's referenced bit, placing a newly loaded page in a free slot of the ring.
+        """
+        slot = self.slots.get(pageIndex)
+        if slot is None:
+            if self.freeSlots:
+                slot = self.freeSlots.pop()
+                self.ring[slot] = pageIndex
+            else:
+                slot = len(self.ring)
+                self.ring.append(pageIndex)
+                self.referenced.append(0)
+            self.slots[pageIndex] = slot
+        self.referenced[slot] = 1
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Sweep the hand around the ring, clearing referenced bits, and evict the first page
+        found with its bit already clear.
+        """
+        if not self.slots:
+            raise RuntimeError("Clock is empty, no pages to replace.")
+
+        ring = self.ring
+        referenced = self.referenced
+        hand = self.hand
+        while ring[hand] is None or referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % len(ring)
+
+        pageIndex = ring[hand]
+        ring[hand] = None
+        del self.slots[pageIndex]
+        self.freeSlots.append(hand)
+        self.hand = (hand + 1) % len(ring)
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class LFUPageReplacementPolicy(PageReplacementPolicy):
+    def __init__(self):
+        self.counts = {}  # page -> access count
+        self.buckets = {}  # access count -> OrderedDict of pages, least recently used first
+        self.minCount = 0
+
+    def access_page(self, pageIndex):
+        """
+        Move the page from its count bucket to the next one, in O(1).
+        """
+        count = self.counts.get(pageIndex, 0)
+        if count:
+            bucket = self.buckets[count]
+            del bucket[pageIndex]
+            if not bucket:
+                del self.buckets[count]
+                if self.minCount == count:
+                    self.minCount = count + 1
+        else:
+            self.minCount = 1
+        self.counts[pageIndex] = count + 1
+        self.buckets.setdefault(count + 1, OrderedDict())[pageIndex] = None
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Evict the least frequently used page, the least recently used one among ties.
+        """
+        if not self.counts:
+            raise RuntimeError("LFU table is empty, no pages to replace.")
+
+        if self.minCount not in self.buckets:
+            self.minCount = min(self.buckets)
+        bucket = self.buckets[self.minCount]
+        pageIndex, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self.buckets[self.minCount]
+        del self.counts[pageIndex]
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class ARCPageReplacementPolicy(PageReplacementPolicy):
+    """
+    Adaptive Replacement Cache (Megiddo and Modha). Resident pages are split between t1 (seen once)
+    and t2 (seen again); the ghost lists b1 and b2 remember recently evicted pages from each, and
+    hits on them move the target size of t1 up or down.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.target = 0  # preferred size of t1
+        self.t1 = OrderedDict()  # every list is least recently used first
+        self.t2 = OrderedDict()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        self.victimList = None  # "t1", "t2" or "discard", chosen by prepare_replacement
+
+    def access_page(self, pageIndex):
+        """
+        Move a resident or ghost page to the most recent end of t2; a new page goes to t1.
+        """
+        for recent in (self.t1, self.t2, self.b1, self.b2):
+            if pageIndex in recent:
+                del recent[pageIndex]
+                self.t2[pageIndex] = None
+                return
+        self.t1[pageIndex] = None
+
+    def prepare_replacement(self, pageIndex):
+        """
+        Adapt the t1 target to a ghost hit and trim the ghost lists before a page is evicted.
+        """
+        c = self.capacity
+        if pageIndex in self.b1:
+            self.target = min(c, self.target + max(len(self.b2) // len(self.b1), 1))
+            self.victimList = self.choose_victim(False)
+        elif pageIndex in self.b2:
+            self.target = max(0, self.target - max(len(self.b1) // len(self.b2), 1))
+            self.victimList = self.choose_victim(True)
+        elif len(self.t1) + len(self.b1) >= c:
+            if len(self.t1) < c:
+                self.b1.popitem(last=False)
+                self.victimList = self.choose_victim(False)
+            else:
+                self.victimList = "discard"  # t1 alone fills the cache: drop its LRU page, no ghost
+        else:
+            if len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) >= 2 * c and self.b2:
+                self.b2.popitem(last=False)
+            self.victimList = self.choose_victim(False)
+
+    def resize(self, capacity):
+        """Adopt a new cache size, clamping the t1 target and dropping the ghosts that no longer fit."""
+        self.capacity = capacity
+        self.target = min(self.target, capacity)
+        while self.b1 and len(self.t1) + len(self.b1) > capacity:
+            self.b1.popitem(last=False)
+        while self.b2 and len(self.t1) + len(self.t2) + len(self.b1) + len(self.b2) > 2 * capacity:
+            self.b2.popitem(last=False)
+
+    def choose_victim(self, ghostInB2):
+        """ARC's REPLACE rule: take from t1 when it is above its target size."""
+        t1Size = len(self.t1)
+        if t1Size and (t1Size > self.target or (ghostInB2 and t1Size == self.target)):
+            return "t1"
+        return "t2"
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Evict the LRU page of t1 or t2, as chosen by prepare_replacement, and remember it as a ghost.
+        """
+        if not self.t1 and not self.t2:
+            raise RuntimeError("ARC lists are empty, no pages to replace.")
+
+        victimList = self.victimList or self.choose_victim(False)
+        self.victimList = None
+        if not self.t2:
+            victimList = "discard" if victimList == "discard" else "t1"
+        elif not self.t1:
+            victimList = "t2"
+
+        if victimList == "t2":
+            pageIndex, _ = self.t2.popitem(last=False)
+            self.b2[pageIndex] = None
+        else:
+            pageIndex, _ = self.t1.popitem(last=False)
+            if victimList == "t1":
+                self.b1[pageIndex] = None
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class WorkingSetPageReplacementPolicy(PageReplacementPolicy):
+    """
+    Denning's working set: a page belongs to the working set while it was used within the last
+    `window` accesses seen by the policy, and is released once it falls out. Time is counted in the
+    accesses the policy sees, so a per-process policy runs on that process's virtual time.
+    When the working set does not fit in memory, its least recently used page is evicted.
+    """
+    expires = True
+
+    def __init__(self, window: int = DEFAULT_WORKING_SET_WINDOW):
+        if window < 1:
+            raise ValueError("Working set window must be at least one access.")
+        self.window = window
+        self.time = 0
+        self.lastUse = OrderedDict()  # page -> time of its last use, least recently used first
+
+    def access_page(self, pageIndex):
+        """
+        Stamp the page with the current time and move it to the most recent end.
+        """
+        self.time += 1
+        self.lastUse[pageIndex] = self.time
+        self.lastUse.move_to_end(pageIndex)
+
+    def release_expired(self, pageTable, frameTable, tlb):
+        """
+        Evict every page whose last use is more than `window` accesses ago.
+        """
+        evicted = []
+        horizon = self.time - self.window
+        lastUse = self.lastUse
+        while lastUse and next(iter(lastUse.values())) <= horizon:
+            pageIndex, _ = lastUse.popitem(last=False)
+            tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+            evicted.append([pageIndex, frameIndex, tlb_invalidated_entry])
+        return evicted
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Evict the least recently used page of the working set.
+        """
+        if not self.lastUse:
+            raise RuntimeError("Working set is empty, no pages to replace.")
+
+        pageIndex, _ = self.lastUse.popitem(last=False)
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+class OPTPageReplacementPolicy(PageReplacementPolicy):
+    """
+    Belady's optimal policy: evict the page whose next use is furthest away. Needs the whole trace,
+    from which a next-use index is precomputed once; evictions then cost O(log n) through a max-heap
+    with lazily deleted stale entries.
+    """
+    offline = True
+
+    def __init__(self):
+        self.nextUse = np.zeros(0, dtype=np.int64)
+        self.traceLength = 0
+        self.time = 0
+        self.resident = {}  # page -> position of its next use
+        self.heap = []  # (-next use, page), may hold stale entries
+
+    def set_trace(self, vpns, start=0):
+        """
+        Precompute, for every position of the trace, the position of the next access to the same page.
+        """
+        vpns = np.asarray(vpns, dtype=np.uint64)
+        n = len(vpns)
+        order = np.argsort(vpns, kind="stable")
+        nextUse = np.full(n, n, dtype=np.int64)
+        if n > 1:
+            same = vpns[order[1:]] == vpns[order[:-1]]
+            nextUse[order[:-1][same]] = order[1:][same]
+        self.nextUse = nextUse
+        self.traceLength = n
+        self.time = start
+
+        # Pages already resident keep their place, keyed by their next use from `start` on
+        pending = set(self.resident)
+        for page in pending:
+            self.resident[page] = n
+        for position in range(start, n):
+            if not pending:
+                break
+            page = int(vpns[position])
+            if page in pending:
+                self.resident[page] = position
+                pending.discard(page)
+        self.heap = [(-position, page) for page, position in self.resident.items()]
+        heapq.heapify(self.heap)
+
+    def access_page(self, pageIndex):
+        """
+        Record the next use of the page at the current position of the trace.
+        """
+        time = self.time
+        position = int(self.nextUse[time]) if time < self.traceLength else self.traceLength
+        self.time = time + 1
+        self.resident[pageIndex] = position
+        heapq.heappush(self.heap, (-position, pageIndex))
+        if len(self.heap) > 4 * len(self.resident) + 64:
+            self.heap = [(-position, page) for page, position in self.resident.items()]
+            heapq.heapify(self.heap)
+
+    def replace_page(self, pageTable, frameTable, tlb):
+        """
+        Evict the resident page that is used again furthest in the future (or never).
+        """
+        heap = self.heap
+        resident = self.resident
+        while heap:
+            position, pageIndex = heapq.heappop(heap)
+            if resident.get(pageIndex) == -position:
+                break
+        else:
+            raise RuntimeError("OPT has no resident pages to replace.")
+        del resident[pageIndex]
+
+        tlb_invalidated_entry,frameIndex = pageTable.page_evict(pageIndex, frameTable, tlb)
+
+        return [pageIndex, frameIndex, tlb_invalidated_entry]
+
+
+PAGE_REPLACEMENT_POLICIES = {
+    "FIFO": FIFOPageReplacementPolicy,
+    "LRU": LRUPageReplacementPolicy,
+    "CLOCK": ClockPageReplacementPolicy,
+    "SecondChance": SecondChancePageReplacementPolicy,
+    "LFU": LFUPageReplacementPolicy,
+    "ARC": ARCPageReplacementPolicy,
+    "WS": WorkingSetPageReplacementPolicy,
+    "OPT": OPTPageReplacementPolicy,
+}
+
+
+def create_page_replacement_policy(name, numFrames, workingSetWindow=DEFAULT_WORKING_SET_WINDOW):
+    """Build a policy by name; ARC is sized to the number of frames it manages, WS to its window."""
+    if name not in PAGE_REPLACEMENT_POLICIES:
+        raise ValueError(f"Unknown page replacement policy: {name}")
+    if name == "ARC":
+        return ARCPageReplacementPolicy(numFrames)
+    if name == "WS":
+        return WorkingSetPageReplacementPolicy(workingSetWindow)
+    return PAGE_REPLACEMENT_POLICIES[name]()
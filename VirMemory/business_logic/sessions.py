@@ -0,0 +1,113 @@
+"""
+Simulators of many users in one server, one per session.
+
+Requests of a session take turns on its lock, while different sessions run in parallel. Idle
+sessions are evicted, least recently used first, when there are too many, when their simulators
+together use more than a memory budget, or when they have been idle too long.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_SESSIONS = 100
+SESSION_MEMORY_BUDGET = 2 ** 30  # bytes, as estimated by Simulator.memory_estimate, plus checkpoints
+SESSION_IDLE_TIMEOUT = 60 * 60  # seconds
+
+
+class Session:
+    def __init__(self, sessionId):
+        self.sessionId = sessionId
+        self.simulator = None
+        self.lock = threading.RLock()
+        self.users = 0  # requests holding or waiting for the lock, and running jobs; a session in use is never evicted
+        self.lastUsed = time.monotonic()
+        self.memorySize = 0  # estimated when the last request finished
+        self.checkpoints = OrderedDict()  # checkpoint ID -> business_logic.checkpoint.Checkpoint, oldest first
+
+
+class SessionRegistry:
+    def __init__(self, maxSessions=MAX_SESSIONS, memoryBudget=SESSION_MEMORY_BUDGET, idleTimeout=SESSION_IDLE_TIMEOUT):
+        if maxSessions < 1:
+            raise ValueError("A session registry must hold at least one session.")
+        self.maxSessions = maxSessions
+        self.memoryBudget = memoryBudget
+        self.idleTimeout = idleTimeout
+        self.sessions = OrderedDict()  # session ID -> Session, least recently used first
+        self.lock = threading.Lock()  # guards `sessions` and the bookkeeping of every Session
+        self.evictions = 0
+
+    @contextmanager
+    def use(self, sessionId):
+        """
+        Hold the session's lock for the duration of a request, creating the session if it does not
+        exist. Its simulator is read and replaced through the yielded Session.
+        """
+        with self.lock:
+            session = self.sessions.get(sessionId)
+            if session is None:
+                session = self.sessions[sessionId] = Session(sessionId)
+            self.sessions.move_to_end(sessionId)
+            session.users += 1
+            memorySize = session.memorySize
+        try:
+            with session.lock:
+                try:
+                    yield session
+                finally:
+                    memorySize = session.simulator.memory_estimate() if session.simulator else 0
+                    memorySize += sum(len(checkpoint) for checkpoint in session.checkpoints.values())
+        finally:
+            with self.lock:
+                session.users -= 1
+                session.lastUsed = time.monotonic()
+                self.sessions.move_to_end(sessionId)  # sessions in use are never evicted
+                session.memorySize = memorySize
+                self.evict()
+
+    def pin(self, sessionId):
+        """Keep a session from being evicted, e.g. while a background job runs on it, until unpin."""
+        with self.lock:
+            session = self.sessions.get(sessionId)
+            if session is None:
+                session = self.sessions[sessionId] = Session(sessionId)
+            session.users += 1
+
+    def unpin(self, sessionId):
+        with self.lock:
+            session = self.sessions.get(sessionId)
+            if session is not None:
+                session.users -= 1
+                session.lastUsed = time.monotonic()
+                self.evict()
+
+    def evict(self):
+        """
+        Drop idle sessions, least recently used first, until the registry is within its limits. The
+        most recently used session is kept even if it alone is over the budget.
+        """
+        now = time.monotonic()
+        memorySize = sum(session.memorySize for session in self.sessions.values())
+        mostRecent = next(reversed(self.sessions), None)
+        for sessionId, session in list(self.sessions.items()):
+            overLimit = len(self.sessions) > self.maxSessions or memorySize > self.memoryBudget
+            expired = now - session.lastUsed > self.idleTimeout
+            if session.simulator is None and not session.checkpoints:
+                evictable = not session.users
+            else:
+                evictable = not session.users and sessionId != mostRecent and (overLimit or expired)
+            if not evictable:
+                continue
+            del self.sessions[sessionId]
+            memorySize -= session.memorySize
+            if session.simulator is not None or session.checkpoints:
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "memoryEstimate": sum(session.memorySize for session in self.sessions.values()),
+                "memoryBudget": self.memoryBudget,
+                "evictions": self.evictions,
+            }
@@ -1,23 +1,94 @@
+import functools
+import itertools
 import math
+from collections import deque
 import random
-import re
 
-from business_logic.replacement_policy import FIFOPageReplacementPolicy, LRUPageReplacementPolicy
-from models.page import PageTable
-from models.tlb import TLBEntry, TLB
+import numpy as np
+
+from business_logic.cost_model import CostModel
+from business_logic.frame_allocation import create_frame_allocator, REPLACEMENT_SCOPES
+from business_logic.replacement_policy import create_page_replacement_policy, PAGE_REPLACEMENT_POLICIES, DEFAULT_WORKING_SET_WINDOW
+from business_logic.thrashing import ThrashingMonitor, THRASHING_INTERVAL
+from business_logic.trace_file import ACCESS_READ, ACCESS_WRITE, ACCESS_EXECUTE, ACCESS_TYPE_NAMES, MAX_PROCESS_ID
+from models.frame_table import FrameTable
+from models.page import PageTable, SparsePageTable, RadixPageTable
+from models.process import Process, AddressSpaces
+from models.tlb import TLBEntry, TLB, TLBHierarchy, TLB_REPLACEMENT_POLICIES, TLB_INCLUSION_POLICIES, TLB_CONTEXT_MODES
+
+
+TRACE_CHUNK_SIZE = 1 << 20
+SEQUENCE_WINDOW = 50  # addresses shown on each side of the current one for memory-mapped traces
+CHANGE_LOG_SIZE = 4096  # table changes kept for delta responses; clients further behind resync from a snapshot
+TABLES = ("vas", "page_table", "ram", "tlb", "itlb")
+TLB_TABLES = ("tlb", "itlb")  # L1 data TLB and L1 instruction TLB; the latter has no rows without an L1i
+PAGE_TABLE_MODES = {"flat": PageTable, "sparse": SparsePageTable, "radix": RadixPageTable}
+MAX_FLAT_PAGES = 2 ** 22  # flat page tables take 7 bytes per page, all allocated up front
+HUGE_PAGE_SIZES = (2 ** 21, 2 ** 30)
+# Entries and associativity of the TLB that caches each huge page size (x86 keeps them apart in L1)
+HUGE_PAGE_TLB_GEOMETRY = {2 ** 21: (32, 4), 2 ** 30: (4, 4)}
+# Rough sizes for memory_estimate: a frame's frame table byte, a free list entry, the replacement
+# policy entry of a resident page, a page remembered as evicted for refault counting, an address
+# of a sequence entered or loaded as text with its access type and process, and a color
+FRAME_BYTES = 1
+FREE_FRAME_BYTES = 8
+RESIDENT_PAGE_BYTES = 400
+EVICTED_PAGE_BYTES = 70
+SEQUENCE_ENTRY_BYTES = 50
+COLOR_BYTES = 100
+ACCESS_DESCRIPTIONS = {ACCESS_READ: "read", ACCESS_WRITE: "write", ACCESS_EXECUTE: "instruction fetch"}
+
+
+def format_size(size):
+    """Format a power-of-two byte count, e.g. 2097152 -> "2 MB"."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size} {unit}"
+        size //= 1024
 
 
 class Simulator:
-    def __init__(self,policy, vas,associativity):
+    def __init__(self,policy, vas,associativity, pageSize=4096, memorySize=64 * 1024, tlbSize=16, pageTableMode=None, tlbPolicy="FIFO",
+                 l2TlbSize=0, l2TlbAssociativity=4, tlbInclusion="inclusive", itlbSize=0, costModel=None,
+                 tlbContextMode="asid", replacementScope="global", frameAllocator="equal",
+                 workingSetWindow=DEFAULT_WORKING_SET_WINDOW, thrashingInterval=THRASHING_INTERVAL):
         self.pageTable = None
         self.tlb = None
-        print(policy)
-        self.set_page_replacement_policy(policy)
         self.vasSize = 0
         self.vasWidth = 0
-        self.pageSize = 4096
-        self.memorySize = 64
+        self.pageSize = pageSize  # bytes, power of 2
+        self.pageShift = pageSize.bit_length() - 1
+        self.memorySize = memorySize  # bytes of physical memory
+        self.numFrames = memorySize // pageSize
+        if replacementScope not in REPLACEMENT_SCOPES:
+            raise ValueError(f"Unknown page replacement scope: {replacementScope}")
+        self.replacementScope = replacementScope
+        self.frameAllocator = create_frame_allocator(frameAllocator, self.numFrames)
+        self.frameAllocatorName = frameAllocator
+        self.workingSetWindow = workingSetWindow
+        self.thrashingMonitor = ThrashingMonitor(thrashingInterval)
+        self.offlineTraces = {}  # pid -> (pages, start) for per-process OPT policies of processes not started yet
+        self.offlineTraceLength = 0  # length of the trace last handed to an offline policy
+        self.set_page_replacement_policy(policy)
+        self.pageTableMode = pageTableMode  # None: flat, or radix for more than MAX_FLAT_PAGES pages
+        self.tlbPolicy = tlbPolicy
+        self.l2TlbSize = l2TlbSize  # 0: no L2 TLB
+        self.l2TlbAssociativity = l2TlbAssociativity
+        self.tlbInclusion = tlbInclusion
+        self.itlbSize = itlbSize  # 0: instructions share the L1 data TLB
+        if tlbContextMode not in TLB_CONTEXT_MODES:
+            raise ValueError(f"Unknown TLB context switch mode: {tlbContextMode}")
+        self.tlbContextMode = tlbContextMode
+        self.currentPid = 0
+        self.asidBase = 0  # current process ID shifted above the VPN bits; ORed into TLB tags and policy keys
+        self.contextSwitches = 0
+        self.tlbFlushedEntries = 0  # TLB entries dropped by flushes on context switches
+        self.costModel = costModel or CostModel()
+        self.addressStartCycles = 0
+        self.lastAddressCycles = 0  # simulated cycles of the last address completed in step mode
         self.addressSequence = []
+        self.accessTypes = []  # ACCESS_* code of each address in the sequence; None if all are reads
+        self.processIds = []  # process of each address in the sequence; None if all belong to the current process
         self.numPages = 0
         self.case = 0
         self.ppn1 = None
@@ -32,38 +103,312 @@ class Simulator:
         self.currentStep = 0
         self.currentAddressIndex = 0
         self.messages = []
-        self.initialize_page_table_and_tlb(vas,self.pageSize,associativity)
+        self.initialize_page_table_and_tlb(vas,self.pageSize,associativity,tlbSize)
 
-        self.color_changes = {"vas": [], "pt": [], "tlb": [], "ram": []}
+        self.color_changes = {"vas": [], "pt": [], "tlb": [], "itlb": [], "ram": []}
         self.color_state = {
-            "vas": {}, "pt": {}, "tlb": {}, "ram": {}
+            "vas": {}, "pt": {}, "tlb": {}, "itlb": {}, "ram": {}
         }
-        self.frameTable = [False for i in range(self.memorySize // 4)]
+        # Every change to a displayed table bumps the version; the log lets clients catch up with a delta
+        self.version = 0
+        self.changeLog = deque(maxlen=CHANGE_LOG_SIZE)  # (version, kind, table, index)
+        self.track_tlb_rows()
+        self.frameTable = FrameTable(self.numFrames)
+        self.hugeTlbs = {}  # huge page size -> TLB holding only that size
+        self.hugeFrameCounts = {}  # huge page size -> huge frames handed out from the reserved pool
+        self.hugeStats = {}  # huge page size -> TLB and page table counters for accesses of that size
+        self.processStart = self.process_counters()  # counters when the current process was switched in
 
-    def initialize_page_table_and_tlb(self, virtual_address_width, page_size, associativity):
+    def initialize_page_table_and_tlb(self, virtual_address_width, page_size, associativity, tlb_size=16):
 
-        self.numPages = 2 ** (virtual_address_width - 12)
-        num_frames = 64 // page_size
+        self.numPages = 2 ** (virtual_address_width - self.pageShift)
+        if self.pageTableMode is None:
+            # Flat tables allocate every entry up front; larger address spaces only allocate what is touched
+            self.pageTableMode = "flat" if self.numPages <= MAX_FLAT_PAGES else "radix"
+        elif self.pageTableMode not in PAGE_TABLE_MODES:
+            raise ValueError(f"Unknown page table mode: {self.pageTableMode}")
+        elif self.pageTableMode == "flat" and self.numPages > MAX_FLAT_PAGES:
+            raise ValueError(f"A flat Page Table can have at most {MAX_FLAT_PAGES} pages; use sparse or radix.")
 
-        self.pageTable=PageTable(self.numPages, num_frames)
-        self.tlb=TLB(16,associativity)
+        self.pageTable=PAGE_TABLE_MODES[self.pageTableMode](self.numPages, page_size)
+        self.addressSpaces = AddressSpaces(virtual_address_width - self.pageShift)
+        self.pageReplacementPolicy = self.create_process(self.currentPid, self.pageTable).replacementPolicy
+        if self.l2TlbSize or self.itlbSize:
+            self.tlb=TLBHierarchy(tlb_size, associativity, self.l2TlbSize, self.l2TlbAssociativity,
+                                  self.tlbInclusion, self.tlbPolicy, self.itlbSize)
+        else:
+            self.tlb=TLB(tlb_size,associativity,self.tlbPolicy)
         self.vasSize = 2**virtual_address_width
         self.vasWidth = virtual_address_width
 
-    def add_memory_address(self, addr):
+    def add_memory_address(self, addr, accessType=ACCESS_READ, pid=None):
         addr_long = int(addr, 16)
         self.addressSequence.append(addr_long)
+        self.accessTypes.append(accessType)
+        self.processIds.append(self.currentPid if pid is None else pid)
+        self.log_change("sequence")
 
-    def set_memory_sequence(self, addresses):
+    def set_memory_sequence(self, addresses, accessTypes=None, processIds=None):
         self.addressSequence = [int(addr, 16)  for addr in addresses]
+        self.accessTypes = list(accessTypes) if accessTypes is not None else [ACCESS_READ] * len(addresses)
+        self.processIds = list(processIds) if processIds is not None else [self.currentPid] * len(addresses)
+        self.prepare_offline_policy(self.addressSequence, self.currentAddressIndex, self.processIds)
+        self.log_change("sequence")
+
+    def access_type(self, index):
+        """ACCESS_* code of the address at `index` of the sequence."""
+        if self.accessTypes is None or index >= len(self.accessTypes):
+            return ACCESS_READ
+        return int(self.accessTypes[index])
+
+    def process_id(self, index):
+        """Process that makes the access at `index` of the sequence."""
+        if self.processIds is None:
+            return self.currentPid
+        self.check_sequence_columns()
+        if index >= len(self.processIds):
+            return self.currentPid
+        return int(self.processIds[index])
+
+    def check_sequence_columns(self):
+        """Raise ValueError unless the access types and process IDs line up with the address sequence."""
+        for name, column in (("access types", self.accessTypes), ("process IDs", self.processIds)):
+            if column is not None and len(column) != len(self.addressSequence):
+                raise ValueError(f"The address sequence has {len(self.addressSequence)} addresses but {len(column)} {name}.")
+
+    def switch_process(self, pid):
+        """
+        Context switch to process `pid`, creating its address space on first use. Processes have
+        their own page tables but share the frames. In "flush" mode the TLBs are flushed; in
+        "asid" mode their entries stay, tagged with the process ID as ASID.
+        Returns the number of TLB entries flushed.
+        """
+        if pid == self.currentPid:
+            return 0
+        if not 0 <= pid <= MAX_PROCESS_ID:
+            raise ValueError(f"Process ID {pid} is outside 0..{MAX_PROCESS_ID}.")
+
+        self.save_process_counters()
+        process = self.addressSpaces.processes.get(pid)
+        if process is None:
+            process = self.create_process(pid)
+        process.switchIns += 1
+        self.currentPid = pid
+        self.pageTable = process.pageTable
+        self.pageReplacementPolicy = process.replacementPolicy
+        self.log_change("reset", "pt")
+        self.asidBase = self.addressSpaces.global_page(pid, 0)
+        self.contextSwitches += 1
+
+        flushed = 0
+        if self.tlbContextMode == "flush":
+            flushed = self.tlb.flush() + sum(tlb.flush() for tlb in self.hugeTlbs.values())
+            self.tlbFlushedEntries += flushed
+        return flushed
+
+    def create_process(self, pid, pageTable=None):
+        """
+        Start process `pid` with a page table of its own and a frame quota. Under local replacement it
+        also gets a replacement policy of its own; under global replacement all processes share one.
+        """
+        if pageTable is None:
+            pageTable = PAGE_TABLE_MODES[self.pageTableMode](self.numPages, self.pageSize)
+        quota = self.frameAllocator.initial_quota(len(self.addressSpaces) + 1)
+        policy = self.pageReplacementPolicy
+        if self.replacementScope == "local":
+            policy = create_page_replacement_policy(self.policyName, quota, self.workingSetWindow)
+            if pid in self.offlineTraces:
+                policy.set_trace(*self.offlineTraces.pop(pid))
+        process = self.addressSpaces.processes[pid] = Process(pid, pageTable, policy)
+        process.quota = quota
+        if self.replacementScope == "local":
+            # Quotas in force from the process's first access on; equal shares shrink for everyone
+            for other in self.addressSpaces.processes.values():
+                otherQuota = self.frame_quota(other)
+                other.replacementPolicy.resize(otherQuota)
+                self.thrashingMonitor.record_quota(self.tlbHit + self.tlbMiss + 1, other.pid, otherQuota)
+        return process
+
+    def process_time(self, time):
+        """Virtual time of the current process (the accesses it made) at global access count `time`."""
+        counters = self.addressSpaces.processes[self.currentPid].counters
+        return counters["tlbHit"] + counters["tlbMiss"] + time - self.processStart["tlbHit"] - self.processStart["tlbMiss"]
+
+    def frame_quota(self, process):
+        """Frames `process` may hold, or None under global replacement."""
+        if self.replacementScope != "local":
+            return None
+        return self.frameAllocator.quota(process, len(self.addressSpaces))
+
+    def process_counters(self):
+        return {"tlbHit": self.tlbHit, "tlbMiss": self.tlbMiss, "ptHit": self.ptHit, "ptMiss": self.ptMiss}
+
+    def save_process_counters(self):
+        """Credit the accesses made since the current process was switched in to it."""
+        counters = self.process_counters()
+        processCounters = self.addressSpaces.processes[self.currentPid].counters
+        for name, value in counters.items():
+            processCounters[name] += value - self.processStart[name]
+        self.processStart = counters
+
+    def process_stats(self):
+        """Counters and hit rates (in percent) of every process, plus the write-backs of its pages."""
+        self.save_process_counters()
+        stats = []
+        for pid, process in self.addressSpaces.processes.items():
+            counters = process.counters
+            tlbAccesses = counters["tlbHit"] + counters["tlbMiss"]
+            ptAccesses = counters["ptHit"] + counters["ptMiss"]
+            stats.append(dict(pid=pid, **counters,
+                              tlbHitRate=counters["tlbHit"] / tlbAccesses * 100 if tlbAccesses else 0.0,
+                              ptHitRate=counters["ptHit"] / ptAccesses * 100 if ptAccesses else 0.0,
+                              writeBacks=process.pageTable.writeBacks, switchIns=process.switchIns,
+                              residentPages=process.residentPages, quota=self.frame_quota(process)))
+        return stats
+
+    def load_trace_file(self, path, start=0):
+        """
+        Use a binary trace file as the address sequence, memory-mapped instead of read into a list,
+        and resume the step-by-step simulation at address index `start`.
+        """
+        from business_logic.trace_file import TraceFile
+        traceFile = TraceFile(path)
+        if not 0 <= start <= len(traceFile):
+            raise ValueError(f"Start index {start} is outside the trace ({len(traceFile)} addresses)")
+        self.addressSequence = traceFile
+        self.accessTypes = traceFile.accessTypes
+        self.processIds = traceFile.processIds
+        self.currentAddressIndex = start
+        self.currentStep = 0
+        self.prepare_offline_policy(traceFile.addresses, start, traceFile.processIds)
+        self.log_change("sequence")
+        return traceFile
+
+    def add_huge_page_region(self, startAddress, size, hugePageSize=HUGE_PAGE_SIZES[0]):
+        """
+        Map [startAddress, startAddress + size) with huge pages, like a hugetlbfs mapping: huge pages
+        come from a reserved pool outside the base-page frames, are never evicted, and are cached in
+        a TLB of their own. Add regions before running any address inside them.
+        """
+        if hugePageSize & (hugePageSize - 1) or hugePageSize <= self.pageSize:
+            raise ValueError("Huge page size must be a power of 2 larger than the page size.")
+        if size <= 0 or startAddress % hugePageSize or size % hugePageSize:
+            raise ValueError("Huge page regions must be aligned to and a multiple of the huge page size.")
+        if startAddress + size > self.vasSize:
+            raise ValueError("Huge page region is outside the virtual address space.")
+
+        shift = hugePageSize.bit_length() - 1 - self.pageShift
+        region = self.pageTable.add_huge_region(startAddress >> self.pageShift, (startAddress + size) >> self.pageShift,
+                                                hugePageSize, shift)
+        if hugePageSize not in self.hugeTlbs:
+            entries, associativity = HUGE_PAGE_TLB_GEOMETRY.get(hugePageSize, (16, 4))
+            self.hugeTlbs[hugePageSize] = TLB(entries, associativity, self.tlbPolicy)
+            self.hugeFrameCounts[hugePageSize] = 0
+            self.hugeStats[hugePageSize] = {"tlbHit": 0, "tlbMiss": 0, "ptHit": 0, "ptMiss": 0}
+        return region
 
     def set_page_replacement_policy(self, policy):
-        """Set the page replacement policy (FIFO or LRU)."""
-        if policy == "FIFO":
-            self.pageReplacementPolicy = FIFOPageReplacementPolicy()
-        else:
-            self.pageReplacementPolicy = LRUPageReplacementPolicy()
-        print(self.pageReplacementPolicy)
+        """Set the page replacement policy by name (see PAGE_REPLACEMENT_POLICIES)."""
+        self.pageReplacementPolicy = create_page_replacement_policy(policy, self.numFrames, self.workingSetWindow)
+        self.policyName = policy
+
+    def change_page_replacement_policy(self, policy):
+        """
+        Switch a running simulator to another page replacement policy. The new policy starts out
+        knowing only which pages are resident, in VPN order; the history of the old one (recency,
+        frequency, ghost lists) is lost. An offline policy gets the trace before the next run.
+        """
+        shared = create_page_replacement_policy(policy, self.numFrames, self.workingSetWindow)
+        self.policyName = policy
+        self.offlineTraces = {}
+        self.offlineTraceLength = -1
+        for pid, process in self.addressSpaces.processes.items():
+            if self.replacementScope == "local":
+                process.replacementPolicy = create_page_replacement_policy(policy, self.frame_quota(process),
+                                                                           self.workingSetWindow)
+            else:
+                process.replacementPolicy = shared
+            for vpn, _, _, _ in process.pageTable.valid_rows(0, self.numPages):
+                process.replacementPolicy.access_page(self.addressSpaces.global_page(pid, vpn))
+        self.pageReplacementPolicy = self.addressSpaces.processes[self.currentPid].replacementPolicy
+
+    def fork(self, policy=None):
+        """
+        Independent copy of this simulator, to branch a what-if run off its current state, optionally
+        continuing with another page replacement policy. The trace is shared, not copied.
+        """
+        from business_logic.checkpoint import fork
+        simulator = fork(self)
+        if policy is not None:
+            simulator.change_page_replacement_policy(policy)
+        return simulator
+
+    def save_checkpoint(self, path):
+        """Write the whole simulator state to `path` (see business_logic.checkpoint)."""
+        from business_logic.checkpoint import save_checkpoint
+        save_checkpoint(self, path)
+
+    @staticmethod
+    def load_checkpoint(path):
+        """Simulator saved by save_checkpoint, ready to resume where it stopped."""
+        from business_logic.checkpoint import load_checkpoint
+        return load_checkpoint(path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if not isinstance(self.addressSequence, list):
+            # Columns of a memory-mapped trace are mapped again from the trace on restore
+            state["accessTypes"] = state["processIds"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not isinstance(self.addressSequence, list):
+            self.accessTypes = self.addressSequence.accessTypes
+            self.processIds = self.addressSequence.processIds
+
+    def prepare_offline_policy(self, addresses, start=0, processIds=None):
+        """
+        Hand the trace to an offline policy (OPT) before it is replayed from position `start`.
+        `processIds` gives the process of each address; without it they belong to the current process.
+        """
+        if self.pageReplacementPolicy.offline:
+            self.offlineTraceLength = len(addresses)
+            vpns, _, _ = self.preprocess_trace(addresses)
+            pids = self.trace_process_ids(len(vpns), processIds)
+            # Huge pages are pinned and never reach the policy, so leave them out of its trace
+            basePages = np.ones(len(vpns), dtype=bool)
+            for pid, process in self.addressSpaces.processes.items():
+                for region in process.pageTable.hugeRegions:
+                    basePages &= (pids != pid) | (vpns < region.startVpn) | (vpns >= region.endVpn)
+            if not basePages.all():
+                start = int(basePages[:start].sum())
+                vpns = vpns[basePages]
+                pids = pids[basePages]
+            pages = self.global_pages(vpns, pids)
+            if self.replacementScope != "local":
+                self.pageReplacementPolicy.set_trace(pages, start)
+                return
+            # Every process's policy sees only that process's accesses
+            self.offlineTraces = {}
+            for pid in np.unique(pids).tolist():
+                mine = pids == pid
+                trace = (pages[mine], int(mine[:start].sum()))
+                process = self.addressSpaces.processes.get(pid)
+                if process is None:
+                    self.offlineTraces[pid] = trace
+                else:
+                    process.replacementPolicy.set_trace(*trace)
+
+    def trace_process_ids(self, length, processIds=None):
+        """Process IDs of a trace as a uint64 array; without them every access belongs to the current process."""
+        if processIds is None:
+            return np.full(length, self.currentPid, dtype=np.uint64)
+        return np.asarray(processIds, dtype=np.uint64)
+
+    def global_pages(self, vpns, pids):
+        """Vectorized AddressSpaces.global_page: the keys that TLBs and replacement policies see."""
+        return (pids << np.uint64(self.addressSpaces.vpnBits)) | vpns
 
     def calculate_hit_rates(self):
         """Update hit rates for TLB and Page Table."""
@@ -73,6 +418,14 @@ class Simulator:
         totalPtAccesses = self.ptHit + self.ptMiss
         self.ptHitRate = (self.ptHit / totalPtAccesses) * 100 if totalPtAccesses > 0 else 0.0
 
+    def tlb_level_stats(self):
+        """Hits, misses and hit rate (in percent) of every TLB level."""
+        stats = self.tlb.level_stats()
+        for level in stats:
+            accesses = level["hits"] + level["misses"]
+            level["hitRate"] = level["hits"] / accesses * 100 if accesses else 0.0
+        return stats
+
     def reset_steps(self):
         """Reset the simulator's step counter."""
         self.currentStep = 0
@@ -83,10 +436,12 @@ class Simulator:
         if self.color_state[table_type].get(index) != color:
             self.color_changes[table_type].append({"index": index, "color": color})
             self.color_state[table_type][index] = color
+            self.log_change("color", table_type, index)
 
     def reset_colors(self):
-        """Reset colors for entries that were previously marked."""
-        for table_type, changes in self.color_changes.items():
+        """Reset colors for entries that were marked since the last reset."""
+        colorChanges, self.color_changes = self.color_changes, {table_type: [] for table_type in self.color_changes}
+        for table_type, changes in colorChanges.items():
             for change in changes:
                 current_color = change["color"]
                 index = change["index"]
@@ -95,16 +450,119 @@ class Simulator:
                 elif current_color == "green":
                     self.update_color(table_type, index, "DodgerBlue")
 
+    def log_change(self, kind, table=None, index=None):
+        """
+        Record a change for delta responses: a "row" or "color" of a table, a "reset" of a whole
+        table, or a change of the "sequence".
+        """
+        self.version += 1
+        self.changeLog.append((self.version, kind, table, index))
+
+    def track_tlb_rows(self, enabled=True):
+        """
+        Have the L1 TLBs shown in TLB_TABLES log a "row" change for every entry they fill, update or
+        invalidate, or stop them (the fast path logs a reset of the TLB tables instead).
+        """
+        l1d = self.tlb.l1d if isinstance(self.tlb, TLBHierarchy) else self.tlb
+        l1d.onEntryChange = functools.partial(self.log_change, "row", "tlb") if enabled else None
+        l1i, table = self.l1_tlb(instruction=True)
+        if table == "itlb":
+            l1i.onEntryChange = functools.partial(self.log_change, "row", "itlb") if enabled else None
+
+    def changes_since(self, since):
+        """
+        Changes logged after version `since`, as ({table: changed row indices}, {table: changed color
+        indices}, tables reset, sequence changed), or None if the log no longer reaches back that far.
+        """
+        oldest = self.changeLog[0][0] if self.changeLog else self.version + 1
+        if not oldest - 1 <= since <= self.version:
+            return None
+        rows = {"pt": set(), "tlb": set(), "itlb": set()}
+        colors = {table: set() for table in self.color_state}
+        resets = set()
+        sequenceChanged = False
+        for _, kind, table, index in itertools.islice(self.changeLog, since - oldest + 1, None):
+            if kind == "row":
+                rows[table].add(index)
+            elif kind == "color":
+                colors[table].add(index)
+            elif kind == "reset":
+                resets.add(table)
+            else:
+                sequenceChanged = True
+        return rows, colors, resets, sequenceChanged
+
+    def delta(self, since):
+        """
+        What a client at version `since` needs to catch up: the page table and TLB rows and the colors
+        that changed, and the address sequence if it changed. A client further behind than the change
+        log reaches gets a full snapshot instead, marked with "resync".
+        """
+        changes = self.changes_since(since)
+        if changes is None:
+            return dict(self.snapshot(), resync=True)
+        rows, colors, resets, sequenceChanged = changes
+        delta = {
+            "version": self.version,
+            "resync": False,
+            "current_address_index": self.currentAddressIndex,
+            "colors": {table: {index: self.color_state[table][index] for index in sorted(indices)}
+                       for table, indices in colors.items() if indices},
+        }
+        if "pt" in resets:
+            delta["page_table_reset"] = True  # too many rows to send; the client reloads the rows it shows
+            delta["page_table_rows"] = []
+        else:
+            delta["page_table_rows"] = [dict(self.page_table_row(*row), row=row[0])
+                                        for vpn in sorted(rows["pt"]) for row in self.pageTable.rows(vpn, vpn + 1)]
+        if "tlb" in resets:  # covers every TLB table
+            delta["tlb_table"] = self.generate_tlb_table()
+            delta["itlb_table"] = self.generate_tlb_table("itlb")
+            rows["tlb"] = rows["itlb"] = ()
+        delta["tlb_rows"] = [dict(self.tlb_row(index), row=index) for index in sorted(rows["tlb"])]
+        delta["itlb_rows"] = [dict(self.tlb_row(index, "itlb"), row=index) for index in sorted(rows["itlb"])]
+        if sequenceChanged or not isinstance(self.addressSequence, list):
+            delta["sequence"] = self.display_address_sequence()
+        return delta
+
+    def snapshot(self):
+        """
+        The TLB, colors and address sequence at the current version, for a resync. The page table can
+        be too large to send whole, so clients reload the rows they show (see table_rows).
+        """
+        return {
+            "version": self.version,
+            "current_address_index": self.currentAddressIndex,
+            "page_table_reset": True,
+            "table_sizes": {table: self.table_size(table) for table in TABLES},
+            "tlb_table": self.generate_tlb_table(),
+            "itlb_table": self.generate_tlb_table("itlb"),
+            "colors": self.color_state,
+            "sequence": self.display_address_sequence(),
+        }
+
     def break_virtual_address(self, virtualAddress):
         """Break the virtual address into VPN and PO."""
-        vpn = virtualAddress // self.pageSize
-        po = virtualAddress % self.pageSize
+        vpn = virtualAddress >> self.pageShift
+        po = virtualAddress & (self.pageSize - 1)
         return vpn, po
 
-    def tlb_lookup(self, vpn):
+    def l1_tlb(self, instruction=False):
+        """The L1 TLB an access looks up first and the table that shows it: the L1i for instruction fetches, if any."""
+        if instruction and isinstance(self.tlb, TLBHierarchy) and self.tlb.l1i is not None:
+            return self.tlb.l1i, "itlb"
+        return self.tlb, "tlb"
+
+    def tlb_entries(self, table):
+        """Entries of one of TLB_TABLES; the "itlb" table is empty without an L1 instruction TLB."""
+        l1, shown = self.l1_tlb(table == "itlb")
+        return l1.entries if shown == table else []
+
+    def tlb_lookup(self, vpn, instruction=False):
         """Perform a TLB lookup and return the result."""
-        tlbIndex = vpn % len(self.tlb.sets)
-        tag = vpn
+        tag = self.asidBase | vpn
+        l1, table = self.l1_tlb(instruction)
+        tlbIndex = tag % l1.numSets
 
 
         # Generate messages for TLB lookup
@@ -113,101 +571,200 @@ class Simulator:
         self.messages.append(f"Checking set: 0x{tlbIndex:X}")
         self.messages.append(f"Checking if set contains an entry with tag: 0x{tag:X}")
 
-        entry, index = self.tlb.lookup(tag)
+        entry, index = self.tlb.lookup(tag, instruction)
 
         if entry:
             self.tlbHit += 1
             self.messages.append(f"(Checking if discovered entry is valid)")
-            self.messages.append(f"TLB hit")
+            if isinstance(self.tlb, TLBHierarchy):
+                self.messages.append(f"TLB hit in {self.tlb.lastHitLevel}")
+            else:
+                self.messages.append(f"TLB hit")
             self.messages.append(f"PPN: 0x{entry.physicalPageAddress:X}")
-            self.update_color("tlb", index, "green")
+            self.update_color(table, index, "green")
             self.update_color("ram", entry.physicalPageAddress, "green")
             self.currentStep=3
-            self.pageReplacementPolicy.access_page(vpn)
+            self.pageReplacementPolicy.access_page(tag)
             return entry.physicalPageAddress
         else:
             self.tlbMiss += 1
-            for i in range(self.tlb.associativity):
-                self.update_color("tlb", tlbIndex*self.tlb.associativity+i, "red")
-            self.messages.append(f"TLB miss")
+            for i in range(l1.associativity):
+                self.update_color(table, tlbIndex*l1.associativity+i, "red")
+            if isinstance(self.tlb, TLBHierarchy):
+                skipped = "L1d" if table == "itlb" else "L1i"
+                self.messages.append(f"TLB miss in {' and '.join(name for name, _ in self.tlb.levels if name != skipped)}")
+            else:
+                self.messages.append(f"TLB miss")
             self.currentStep += 1
             return None
 
     def page_table_lookup(self, vpn):
         """Check the page table for a VPN and return the result."""
-        page = self.pageTable.pages[vpn]
+        frame = self.pageTable.translate(vpn)
         self.messages.append(f"Checking page table...")
         self.messages.append(f"Checking if VPN: 0x{vpn:X} has valid entry")
 
-        if page.validBit:
+        if frame != -1:
             self.ptHit += 1
-            self.pageReplacementPolicy.access_page(page.index)
+            self.pageReplacementPolicy.access_page(self.asidBase | vpn)
             self.update_color("pt", vpn, "green")
             self.messages.append(f"Page Table entry valid")
             self.messages.append(f"Page Table hit")
-            return page.frame
+            return frame
         else:
             self.ptMiss += 1
+            self.record_page_fault(self.asidBase | vpn, self.tlbHit + self.tlbMiss)
             self.update_color("pt", vpn, "red")
             self.messages.append(f"Page Table entry invalid")
             self.messages.append(f"Page Table miss")
             return None
 
-    def update_tlb(self, vpn, ppn):
-        """Update the TLB using the FIFO replacement policy."""
-        self.messages.append(f"Update TLB with new PTE found using First In First Out replacement policy")
-        global_index = self.tlb.check_and_add_entry(vpn, ppn)
-        self.update_color("tlb", global_index, "green")
+    def invalidated_tlb_rows(self, invalidated):
+        """(table, index) of the TLB rows an eviction invalidated, from what the TLB's invalidate_entry returned."""
+        if isinstance(self.tlb, TLBHierarchy):
+            rows = zip(("tlb", "itlb"), invalidated)
+        else:
+            rows = [("tlb", invalidated)]
+        return [(table, index) for table, index in rows if index is not None]
+
+    def update_tlb(self, vpn, ppn, instruction=False):
+        """Update the TLB using its replacement policy."""
+        self.messages.append(f"Update TLB with new PTE found using {self.tlb.policy.name} replacement policy")
+        global_index = self.tlb.check_and_add_entry(self.asidBase | vpn, ppn, instruction=instruction)
+        self.update_color(self.l1_tlb(instruction)[1], global_index, "green")
 
 
-    def handle_page_fault(self, vpn):
+    def handle_page_fault(self, vpn, instruction=False):
         """Handle a page fault by loading the page from secondary memory."""
 
-        freeFrame = self.pageTable.get_available_frame(self.frameTable)
-        if freeFrame == -1:
-            if isinstance(self.pageReplacementPolicy, FIFOPageReplacementPolicy):
-                policy = "FIFO"
+        tag = self.asidBase | vpn
+        process = self.addressSpaces.processes[self.currentPid]
+        quota = self.frame_quota(process)
+        atQuota = quota is not None and process.residentPages >= quota
+        writeBacks = self.get_counters()["writeBacks"]
+        time = self.tlbHit + self.tlbMiss
+        evicted = self.make_room(tag)
+        if evicted:
+            self.thrashingMonitor.record_evictions([time] * len(evicted), [page for page, _, _ in evicted])
+            policy = self.policyName
+            if atQuota:
+                self.messages.append(f"Process {self.currentPid} is at its quota of {quota} frames: it replaces its own page")
+            for evictedPage,frameIndex,tlb_invalidated in evicted:
+                evictedPid, evictedPageIndex = self.addressSpaces.split(evictedPage)
+                self.messages.append(f"Evicted page index: 0x:{evictedPageIndex:X}")
+                if evictedPid != self.currentPid:
+                    self.messages.append(f"Evicted page belongs to process {evictedPid}")
+                if evictedPid == self.currentPid:
+                    self.log_change("row", "pt", evictedPageIndex)
+                    self.update_color("pt", evictedPageIndex, "gray")
+                self.update_color("ram", frameIndex, "gray")
+                for table, index in self.invalidated_tlb_rows(tlb_invalidated):
+                    self.update_color(table, index, "gray")
+            writtenBack = self.get_counters()["writeBacks"] - writeBacks
+            if len(evicted) > 1:
+                self.messages.append(f"{len(evicted)} pages evicted, {writtenBack} of them dirty and written back")
+            elif writtenBack:
+                self.messages.append(f"Evicted page is dirty: written back to secondary memory")
             else:
-                policy = "LRU"
-            evictedPageIndex,frameIndex,tlb_invalidated = self.pageReplacementPolicy.replace_page(self.pageTable, self.frameTable, self.tlb)
-            self.messages.append(f"Evicted page index: 0x:{evictedPageIndex:X}")
-            self.update_color("pt", evictedPageIndex, "gray")
-            self.update_color("ram", frameIndex, "gray")
-            if tlb_invalidated!=None:
-                self.update_color("tlb", tlb_invalidated, "gray")
+                self.messages.append(f"Evicted page is clean: no write-back needed")
             self.currentStep -= 1
             self.messages.append(f"Update Page Table with PPN using {policy} replacement policy")
             self.messages.append(f"Evicted page index: 0x{evictedPageIndex:X}")
             return
-        self.pageTable.pages[vpn].frame = freeFrame
-        self.pageTable.pages[vpn].validBit = True
-        self.frameTable[freeFrame] = True
-        self.pageReplacementPolicy.access_page(vpn)
+        freeFrame = self.pageTable.get_available_frame(self.frameTable)
+        self.pageTable.map_page(vpn, freeFrame)
+        self.log_change("row", "pt", vpn)
+        process.residentPages += 1
+        self.pageReplacementPolicy.access_page(tag)
         self.update_color("ram", freeFrame, "green")
         self.update_color("pt", vpn, "green")
 
-        self.update_tlb(vpn, freeFrame)
+        self.update_tlb(vpn, freeFrame, instruction)
+
+    def record_page_fault(self, tag, time):
+        """
+        Account a page fault of the current process at global access count `time`: the thrashing
+        metrics and, under local replacement, the frame allocator (PFF adjusts the quota here).
+        """
+        refault = self.thrashingMonitor.take_evicted(tag)
+        self.thrashingMonitor.record_faults(self.currentPid, [time], [time] if refault else ())
+        self.update_frame_quota(time)
+
+    def update_frame_quota(self, time):
+        """Let the frame allocator react to a page fault of the current process (local replacement only)."""
+        if self.replacementScope == "local":
+            process = self.addressSpaces.processes[self.currentPid]
+            if self.frameAllocator.page_fault(process, self.process_time(time)):
+                process.replacementPolicy.resize(self.frame_quota(process))
+                self.thrashingMonitor.record_quota(time, self.currentPid, process.quota)
+
+    def make_room(self, tag):
+        """
+        Evict pages until the current process may take a frame for page `tag`. Pages that left a working
+        set go first. Under local replacement a process at its quota then replaces one of its own pages;
+        if memory is still full, a page of the process furthest over its quota (under global replacement,
+        any page) is evicted. Returns the replace_page result of every evicted page; recording them
+        in the thrashing metrics is up to the caller.
+        """
+        addressSpaces = self.addressSpaces
+        frameTable = self.frameTable
+        policy = self.pageReplacementPolicy
+        evicted = policy.release_expired(addressSpaces, frameTable, self.tlb)
+
+        if self.replacementScope == "local":
+            process = addressSpaces.processes[self.currentPid]
+            quota = self.frame_quota(process)
+            while process.residentPages and process.residentPages >= quota:
+                policy.prepare_replacement(tag)
+                evicted.append(policy.replace_page(addressSpaces, frameTable, self.tlb))
+            if frameTable.is_full():
+                victim = max((other for other in addressSpaces.processes.values() if other.residentPages),
+                             key=lambda other: (other.residentPages - self.frame_quota(other), other.residentPages))
+                if victim is process:
+                    policy.prepare_replacement(tag)
+                evicted.append(victim.replacementPolicy.replace_page(addressSpaces, frameTable, self.tlb))
+        elif frameTable.is_full():
+            policy.prepare_replacement(tag)
+            evicted.append(policy.replace_page(addressSpaces, frameTable, self.tlb))
+        return evicted
 
     def process_next_step(self):
         """Process the next step of the simulation."""
-        va = math.ceil(math.log2(self.vasSize))
-        pa = math.ceil(math.log2(self.memorySize))
         if self.currentAddressIndex >= len(self.addressSequence):
             return "Simulation Complete"
 
         virtualAddress = self.addressSequence[self.currentAddressIndex]
         vpn, po = self.break_virtual_address(virtualAddress)
+        accessType = self.access_type(self.currentAddressIndex)
+        pid = self.process_id(self.currentAddressIndex)
+        instruction = accessType == ACCESS_EXECUTE
         self.reset_colors()
         if self.currentStep!=0: self.messages.append("-----")
 
         if self.currentStep == 0:
+            if self.pageReplacementPolicy.offline and self.offlineTraceLength != len(self.addressSequence):
+                processIds = None if self.processIds is None else self.processIds[:len(self.addressSequence)]
+                self.prepare_offline_policy(self.addressSequence[:], self.currentAddressIndex, processIds)
             self.case = 0
             self.ppn1 = None
+            self.addressStartCycles = self.total_cycles()
             self.messages=[]
+            if pid != self.currentPid:
+                flushed = self.switch_process(pid)
+                self.messages.append(f"Context switch to process {pid}")
+                if self.tlbContextMode == "flush":
+                    self.messages.append(f"TLB flushed: {flushed} entries invalidated")
+                else:
+                    self.messages.append(f"TLB entries kept, tagged with ASID {pid}")
             self.messages.append(f"Break down virtual address into VPN, PO(page offset)")
             self.messages.append(f"VPN: 0x{vpn:X}, PO: 0x{po:X}")
+            self.messages.append(f"Access type: {ACCESS_DESCRIPTIONS[accessType]}")
             self.update_color("vas", vpn, "pink")
-            self.tlb_lookup(vpn)
+            region = self.pageTable.huge_region(vpn)
+            if region is not None:
+                self.huge_page_step(virtualAddress, vpn, region)
+            else:
+                self.tlb_lookup(vpn, instruction)
 
         elif self.currentStep == 1:
             ppn = self.page_table_lookup(vpn)
@@ -222,20 +779,77 @@ class Simulator:
 
         elif self.currentStep == 2:
             if self.case == 1:
-                self.update_tlb(vpn, self.ppn1)
+                self.update_tlb(vpn, self.ppn1, instruction)
                 self.messages.append(f"PPN: 0x{self.ppn1:X}")
             else:
-                self.handle_page_fault(vpn)
+                self.handle_page_fault(vpn, instruction)
 
             self.currentStep += 1
         elif self.currentStep == 3:
             self.update_color("vas", vpn, "DodgerBlue")
+            if accessType == ACCESS_WRITE and self.pageTable.huge_region(vpn) is None:
+                self.pageTable.mark_dirty(vpn)
+                self.log_change("row", "pt", vpn)
+                self.messages.append(f"Write: page 0x{vpn:X} marked dirty")
+            self.lastAddressCycles = self.total_cycles() - self.addressStartCycles
+            self.messages.append(f"Address took {self.lastAddressCycles} cycles")
             self.messages.append(f"Done!")
             self.currentAddressIndex += 1
             self.currentStep = 0
 
         return "\n".join(self.messages)
 
+    def huge_page_step(self, virtualAddress, vpn, region):
+        """Translate an address of a huge page region in one step; huge pages are pinned, so nothing is evicted."""
+        size = format_size(region.pageSize)
+        hugeVpn, frame, hit, fault = self.access_huge_page(vpn, region)
+        self.messages.append(f"Address lies in a {size} huge page region")
+        self.messages.append(f"Huge VPN: 0x{hugeVpn:X}, PO: 0x{virtualAddress & (region.pageSize - 1):X}")
+        self.messages.append(f"Checking the {size} page TLB for tag: 0x{hugeVpn:X}")
+        if hit:
+            self.messages.append(f"TLB hit")
+        else:
+            self.messages.append(f"TLB miss")
+            if fault:
+                self.messages.append(f"Huge page fault: page taken from the reserved {size} pool")
+            else:
+                self.messages.append(f"Huge page found in Page Table")
+            self.messages.append(f"Update {size} page TLB")
+        self.messages.append(f"PPN: 0x{frame:X} ({size} frame)")
+        self.currentStep = 3
+
+    def access_huge_page(self, vpn, region):
+        """
+        Translate an access inside a huge page region through the TLB for its page size.
+        Returns (huge VPN, huge frame, TLB hit, page fault).
+        """
+        hugeVpn = vpn >> region.shift
+        tag = (self.asidBase | vpn) >> region.shift
+        pageSize = region.pageSize
+        stats = self.hugeStats[pageSize]
+        tlb = self.hugeTlbs[pageSize]
+        entry, _ = tlb.lookup(tag)
+        if entry:
+            stats["tlbHit"] += 1
+            self.tlbHit += 1
+            return hugeVpn, entry.physicalPageAddress, True, False
+
+        stats["tlbMiss"] += 1
+        self.tlbMiss += 1
+        frame = self.pageTable.translate_huge(hugeVpn, pageSize)
+        fault = frame == -1
+        if fault:
+            frame = self.hugeFrameCounts[pageSize]
+            self.hugeFrameCounts[pageSize] += 1
+            self.pageTable.map_huge_page(hugeVpn, frame, pageSize)
+            stats["ptMiss"] += 1
+            self.ptMiss += 1
+        else:
+            stats["ptHit"] += 1
+            self.ptHit += 1
+        tlb.check_and_add_entry(tag, frame)
+        return hugeVpn, frame, False, fault
+
     def process_next_address(self):
         """Process the current address completely."""
         if self.currentStep ==0:
@@ -244,70 +858,357 @@ class Simulator:
             self.process_next_step()
         return "\n".join(self.messages)
 
+    def run_trace(self, addresses, accessTypes=None, processIds=None):
+        """
+        Translate a whole address trace in one pass, without the step state machine.
+        No messages or colors are produced; only the hit/miss counters are updated.
+        `accessTypes` optionally gives the ACCESS_* code of each address; without it every access is a read.
+        `processIds` optionally gives the process of each address; without it they all belong to the current process.
+        Returns the TLB and Page Table counters.
+        """
+        if processIds is not None:
+            return self.run_trace_array(np.asarray(addresses, dtype=np.uint64),
+                                        accessTypes=None if accessTypes is None else np.asarray(accessTypes),
+                                        processIds=np.asarray(processIds))
+        pageShift = self.pageShift
+        if self.pageReplacementPolicy.offline:
+            addresses = list(addresses)
+            self.prepare_offline_policy(addresses)
+        return self.run_vpn_trace((virtualAddress >> pageShift for virtualAddress in addresses), accessTypes=accessTypes)
+
+    def run_vpn_trace(self, vpns, setIndices=None, accessTypes=None):
+        """
+        Fast-path translation loop behind run_trace, fed with VPNs of the current process instead of addresses.
+        `setIndices` optionally gives the precomputed TLB set of each VPN, `accessTypes` its ACCESS_* code.
+        """
+        tlb = self.tlb
+        pageTable = self.pageTable
+        addressSpaces = self.addressSpaces
+        frameTable = self.frameTable
+        policy = self.pageReplacementPolicy
+        process = addressSpaces.processes[self.currentPid]
+        # Thrashing metrics are collected as access numbers and handed to the monitor in one batch
+        evictedPages = self.thrashingMonitor.evictedPages
+        faultTimes = []
+        refaultTimes = []
+        evictionTimes = []
+        # Global replacement without working-set expiry only ever evicts when memory is full
+        evictOnlyWhenFull = self.replacementScope == "global" and not policy.expires
+        markDirty = pageTable.mark_dirty
+        asidBase = self.asidBase
+        tlbHit = tlbMiss = ptHit = ptMiss = 0
+        self.track_tlb_rows(False)
+        hugeLow, hugeHigh = pageTable.hugeSpan
+        if setIndices is None:
+            setIndices = itertools.repeat(None)
+        if accessTypes is None:
+            accessTypes = itertools.repeat(ACCESS_READ)
+
+        for vpn, setIndex, accessType in zip(vpns, setIndices, accessTypes):
+            if hugeLow <= vpn < hugeHigh:
+                region = pageTable.huge_region(vpn)
+                if region is not None:
+                    self.access_huge_page(vpn, region)
+                    continue
+
+            tag = vpn | asidBase  # TLB tag and replacement policy key
+            instruction = accessType == ACCESS_EXECUTE
+            entry, _ = tlb.lookup(tag, instruction)
+            if entry:
+                tlbHit += 1
+                policy.access_page(tag)
+                if accessType == ACCESS_WRITE:
+                    markDirty(vpn)
+                continue
+
+            tlbMiss += 1
+            frame = pageTable.translate(vpn)
+            if frame != -1:
+                ptHit += 1
+                policy.access_page(tag)
+                tlb.check_and_add_entry(tag, frame, setIndex, instruction)
+                if accessType == ACCESS_WRITE:
+                    markDirty(vpn)
+                continue
+
+            ptMiss += 1
+            time = self.tlbHit + self.tlbMiss + tlbHit + tlbMiss
+            faultTimes.append(time)
+            if tag in evictedPages:
+                evictedPages.remove(tag)
+                refaultTimes.append(time)
+            if evictOnlyWhenFull:
+                freeFrame = pageTable.get_available_frame(frameTable)
+                if freeFrame == -1:
+                    policy.prepare_replacement(tag)
+                    evictedPages.add(policy.replace_page(addressSpaces, frameTable, tlb)[0])
+                    evictionTimes.append(time)
+                    freeFrame = pageTable.get_available_frame(frameTable)
+            else:
+                self.update_frame_quota(time)
+                for evictedPage, _, _ in self.make_room(tag):
+                    evictedPages.add(evictedPage)
+                    evictionTimes.append(time)
+                freeFrame = pageTable.get_available_frame(frameTable)
+            pageTable.map_page(vpn, freeFrame)
+            process.residentPages += 1
+            policy.access_page(tag)
+            tlb.check_and_add_entry(tag, freeFrame, setIndex, instruction)
+            if accessType == ACCESS_WRITE:
+                markDirty(vpn)
+
+        self.tlbHit += tlbHit
+        self.tlbMiss += tlbMiss
+        self.ptHit += ptHit
+        self.ptMiss += ptMiss
+        self.thrashingMonitor.record_faults(self.currentPid, faultTimes, refaultTimes)
+        self.thrashingMonitor.record_evictions(evictionTimes)
+        # Rows changed wholesale: clients at an older version reload both tables
+        self.track_tlb_rows()
+        self.log_change("reset", "pt")
+        self.log_change("reset", "tlb")
+        return self.get_counters()
+
+    def preprocess_trace(self, addresses, processIds=None):
+        """
+        Split a whole trace (integers or hex strings) into NumPy arrays of VPNs, offsets and TLB set indices.
+        TLB sets are taken from the tags, so `processIds` (default: the current process) can move them
+        when the VPN has fewer bits than the set index.
+        """
+        from business_logic.trace import preprocess_trace
+        vpns, offsets, setIndices = preprocess_trace(addresses, self.pageShift, self.tlb.numSets)
+        if processIds is not None or self.asidBase:
+            tags = self.global_pages(vpns, self.trace_process_ids(len(vpns), processIds))
+            setIndices = tags % np.uint64(self.tlb.numSets)
+        return vpns, offsets, setIndices
+
+    def run_trace_array(self, addresses, chunkSize=TRACE_CHUNK_SIZE, accessTypes=None, processIds=None):
+        """
+        Run a large trace through the vectorized pre-processing stage and then the fast-path loop.
+        The trace is handled in chunks so the intermediate arrays stay bounded.
+        `accessTypes` is an optional array of ACCESS_* codes lined up with the addresses, `processIds`
+        an optional array of process IDs; the run switches process wherever the ID changes.
+        """
+        self.prepare_offline_policy(addresses, 0, processIds)
+        for start in range(0, len(addresses), chunkSize):
+            stop = start + chunkSize
+            self.run_trace_chunk(addresses[start:stop], None if accessTypes is None else accessTypes[start:stop],
+                                 None if processIds is None else processIds[start:stop])
+        return self.get_counters()
+
+    def run_trace_chunk(self, addresses, accessTypes=None, processIds=None):
+        """One chunk of run_trace_array; an offline policy must have been given the trace already."""
+        vpns, _, setIndices = self.preprocess_trace(addresses, processIds)
+        vpns = vpns.tolist()
+        setIndices = setIndices.tolist()
+        types = None if accessTypes is None else accessTypes.tolist()
+        if processIds is None:
+            self.run_vpn_trace(vpns, setIndices, types)
+            return
+
+        switches = (np.flatnonzero(processIds[1:] != processIds[:-1]) + 1).tolist()
+        for segmentStart, segmentStop in zip([0] + switches, switches + [len(vpns)]):
+            self.switch_process(int(processIds[segmentStart]))
+            self.run_vpn_trace(vpns[segmentStart:segmentStop], setIndices[segmentStart:segmentStop],
+                               None if types is None else types[segmentStart:segmentStop])
+
+    def run_sequence(self, count=None, chunkSize=TRACE_CHUNK_SIZE):
+        """
+        Run up to `count` addresses of the address sequence from the current one (by default all that
+        remain) through the fast path, without messages or colors, and move past them. An address
+        already stepped into is finished step by step first. Returns how many addresses were run.
+        """
+        self.check_sequence_columns()
+        begin = self.currentAddressIndex
+        if self.currentStep:
+            self.process_next_address()
+        total = len(self.addressSequence)
+        stop = total if count is None else min(total, begin + count)
+        if self.pageReplacementPolicy.offline and self.offlineTraceLength != total:
+            processIds = None if self.processIds is None else self.processIds[:total]
+            self.prepare_offline_policy(self.addressSequence[:], self.currentAddressIndex, processIds)
+        for start in range(self.currentAddressIndex, stop, chunkSize):
+            end = min(stop, start + chunkSize)
+            accessTypes = None if self.accessTypes is None else np.asarray(self.accessTypes[start:end], dtype=np.uint8)
+            processIds = None if self.processIds is None else np.asarray(self.processIds[start:end], dtype=np.uint16)
+            self.run_trace_chunk(np.asarray(self.addressSequence[start:end], dtype=np.uint64), accessTypes, processIds)
+            self.currentAddressIndex = end
+        self.currentAddressIndex = max(self.currentAddressIndex, stop)
+        return self.currentAddressIndex - begin
+
+    def run_trace_file(self, path, format="auto", chunkSize=TRACE_CHUNK_SIZE, start=0):
+        """
+        Stream a trace file (hex text, Valgrind Lackey, multi-process text or raw uint64, optionally
+        gzipped, or a binary trace file) through the fast path chunk by chunk, so memory use does not
+        depend on the trace length. `start` skips that many addresses first. An offline policy (OPT)
+        needs the whole trace, so it is read in full instead. Access types recorded in the trace mark
+        pages dirty; accesses without a process ID belong to process 0.
+        """
+        from business_logic.trace_reader import read_trace, read_trace_array
+        if self.pageReplacementPolicy.offline:
+            addresses, accessTypes, processIds = read_trace_array(path, format, accessTypes=True, processIds=True)
+            return self.run_trace_array(addresses[start:], chunkSize, accessTypes[start:], processIds[start:])
+        for chunk, accessTypes, processIds in read_trace(path, format, chunkSize, start, accessTypes=True, processIds=True):
+            self.run_trace_array(chunk, chunkSize, accessTypes, processIds)
+        return self.get_counters()
+
+    def stack_distance_profile(self, addresses):
+        """
+        One-pass LRU analysis of a trace at this simulator's page size.
+        profile.miss_curve()[frames] is the page-fault count of LRU replacement with that many frames,
+        and, since a TLB caches the same VPNs, also the miss count of a fully-associative LRU TLB
+        with that many entries (ignoring invalidations from page evictions).
+        """
+        from business_logic.stack_distance import analyze_trace
+        return analyze_trace(addresses, self.pageShift)
+
+    def page_size_stats(self):
+        """TLB and page table counters broken out by page size, base pages first."""
+        base = self.process_counters()
+        hugeRows = []
+        for pageSize, stats in sorted(self.hugeStats.items()):
+            hugeRows.append(dict(pageSize=pageSize, **stats))
+            for counter, value in stats.items():
+                base[counter] -= value
+        return [dict(pageSize=self.pageSize, **base)] + hugeRows
+
+    def total_cycles(self):
+        """Simulated cycles of every access so far, derived from the counters under the cost model."""
+        cost = self.costModel
+        cycles = (self.tlbHit + self.tlbMiss) * cost.ramCycles + self.ptMiss * cost.pageFaultCycles
+        cycles += self.get_counters()["writeBacks"] * cost.writeBackCycles
+        for level in self.tlb.level_stats():
+            cycles += (level["hits"] + level["misses"]) * cost.tlb_lookup_cycles(level["level"])
+        for stats in self.page_size_stats():
+            shift = stats["pageSize"].bit_length() - 1 - self.pageShift
+            cycles += (stats["ptHit"] + stats["ptMiss"]) * self.pageTable.walk_levels(shift) * cost.walkLevelCycles
+            if shift:
+                cycles += (stats["tlbHit"] + stats["tlbMiss"]) * cost.tlbCycles
+        return cycles
+
+    def cost_stats(self):
+        """Total simulated cycles and the effective access time (cycles per address) of the run."""
+        accesses = self.tlbHit + self.tlbMiss
+        totalCycles = self.total_cycles()
+        return {
+            "totalCycles": totalCycles,
+            "accesses": accesses,
+            "effectiveAccessTime": totalCycles / accesses if accesses else 0.0,
+            "lastAddressCycles": self.lastAddressCycles,
+        }
+
+    def get_counters(self):
+        pageTables = self.addressSpaces.page_tables()
+        return {"tlbHit": self.tlbHit, "tlbMiss": self.tlbMiss, "ptHit": self.ptHit, "ptMiss": self.ptMiss,
+                "writeBacks": sum(pageTable.writeBacks for pageTable in pageTables),
+                "cleanEvictions": sum(pageTable.cleanEvictions for pageTable in pageTables),
+                "contextSwitches": self.contextSwitches, "tlbFlushedEntries": self.tlbFlushedEntries,
+                "refaults": self.thrashingMonitor.refaults}
+
+    def memory_estimate(self):
+        """Approximate bytes held by this simulator; memory-mapped traces are not counted."""
+        pageTables = sum(process.pageTable.memory_size() for process in self.addressSpaces.processes.values())
+        sequence = len(self.addressSequence) if isinstance(self.addressSequence, list) else 0
+        colors = sum(len(colors) for colors in self.color_state.values())
+        frames = self.numFrames * FRAME_BYTES + len(self.frameTable.freeFrames) * FREE_FRAME_BYTES
+        return (pageTables + frames + self.frameTable.usedCount * RESIDENT_PAGE_BYTES
+                + len(self.thrashingMonitor.evictedPages) * EVICTED_PAGE_BYTES
+                + sequence * SEQUENCE_ENTRY_BYTES + colors * COLOR_BYTES)
+
+    def thrashing_stats(self, start=0, stop=None):
+        """Fault, refault and eviction rates per interval of accesses (see ThrashingMonitor.stats)."""
+        return self.thrashingMonitor.stats(self.tlbHit + self.tlbMiss, start, stop)
+
+    def thrashing_interval_count(self):
+        return self.thrashingMonitor.interval_count(self.tlbHit + self.tlbMiss)
+
+    def thrashing_summary(self):
+        return self.thrashingMonitor.summary(self.tlbHit + self.tlbMiss)
+
     def generate_random_address(self):
         """Generate a sequence of virtual addresses."""
         address_width = self.vasWidth
         max_address = 2 ** address_width - 1
         address = random.randint(0, max_address)
         self.addressSequence.append(address)
+        self.accessTypes.append(random.choice((ACCESS_READ, ACCESS_WRITE)))
+        self.processIds.append(self.currentPid)
+        self.log_change("sequence")
+
+    def table_size(self, table):
+        """Number of rows in one of TABLES."""
+        if table not in TABLES:
+            raise ValueError(f"Unknown table: {table}")
+        if table in TLB_TABLES:
+            return len(self.tlb_entries(table))
+        return {"vas": self.numPages, "page_table": self.numPages, "ram": self.numFrames}[table]
+
+    def table_rows(self, table, start=0, stop=None, validOnly=False):
+        """
+        Generate rows [start, stop) of one of TABLES, each with its "row" number, formatting only the
+        rows that are consumed. With `validOnly`, only the page table's valid entries in that range.
+        """
+        size = self.table_size(table)
+        stop = size if stop is None else min(stop, size)
+        if validOnly and table != "page_table":
+            raise ValueError("Only the page table can be filtered to valid entries.")
+        if table == "page_table":
+            rows = self.pageTable.valid_rows(start, stop) if validOnly else self.pageTable.rows(start, stop)
+            return (dict(self.page_table_row(*row), row=row[0]) for row in rows)
+        if table == "vas":
+            return (dict(self.vas_row(vpn), row=vpn) for vpn in range(start, stop))
+        if table == "ram":
+            return ({'physical_address': f"0x{frame:X}", 'row': frame} for frame in range(start, stop))
+        return (dict(self.tlb_row(index, table), row=index) for index in range(start, stop))
+
+    def generate_vas_table(self, start=0, stop=None):
+        """Generate the Virtual Address Space (VAS) table, or rows [start, stop) of it."""
+        return list(self.table_rows("vas", start, stop))
+
+    def vas_row(self, vpn):
+        required_digits = (self.vasWidth - self.pageShift)//4
+        if required_digits > 1:
+            return {'virtual_address': f"0x{vpn:0{required_digits}X}"}
+        return {'virtual_address': f"0x{vpn:X}"}
+
+    def generate_page_table(self, start=0, stop=None):
+        """Generate the Page Table, or rows [start, stop) of it."""
+        return list(self.table_rows("page_table", start, stop))
+
+    def page_table_row(self, vpn, valid, frame, dirty):
+        return {
+            'index': f"0x{vpn:X}",
+            'valid': valid,
+            'dirty': dirty,
+            'ppn': f"0x{frame:X}" if frame >= 0 else "--"
+        }
+
+    def generate_ram_table(self, start=0, stop=None):
+        """Generate the RAM table, or rows [start, stop) of it."""
+        return list(self.table_rows("ram", start, stop))
 
-    def generate_vas_table(self):
-            """Generate the Virtual Address Space (VAS) table."""
-            size = 2 ** self.vasWidth
-            required_digits = (self.vasWidth -12)//4
-            if required_digits > 1:
-                return [{'virtual_address': f"0x{addr:0{required_digits}X}"} for addr in range(size // self.pageSize)]
-            else :
-                return [{'virtual_address': f"0x{addr:X}"} for addr in range(size // self.pageSize)]
-
-    def generate_page_table(self):
-        """Generate the Page Table."""
-        table = []
-        size = self.memorySize * 1024 // 4096
-        required_digits = (math.ceil(math.log2(size)))//4
-        for i, entry in enumerate(self.pageTable.pages):
-            if required_digits == 1: table.append({
-                'index': f"0x{entry.index:X}",
+    def generate_tlb_table(self, table="tlb"):
+        """Generate the TLB table (or with "itlb" the L1 instruction TLB's) with all indexes and dynamic formatting."""
+        return [self.tlb_row(index, table) for index in range(len(self.tlb_entries(table)))]
+
+    def tlb_row(self, index, table="tlb"):
+        """One row of a TLB table: the entry at global index `index` (set * associativity + way)."""
+        l1, _ = self.l1_tlb(table == "itlb")
+        entry = l1.entries[index]
+        set_index = index // l1.associativity
+        if entry is not None:
+            return {
+                'set': set_index,
                 'valid': entry.validBit,
-                'ppn': f"0x{entry.frame:X}" if entry.frame >= 0 else "--"
-            })
-            else:
-                table.append({
-                    'index': f"0x{entry.index:X}",
-                    'valid': entry.validBit,
-                    'ppn': f"0x{entry.frame:X}" if entry.frame >= 0 else "--"
-                })
-        return table
-
-    def generate_ram_table(self):
-        """Generate the RAM table."""
-        size = self.memorySize * 1024 // 4096
-        return [{'physical_address': f"0x{frame:X}"} for frame in range(size)]
-
-    def generate_tlb_table(self):
-        """Generate the TLB table with all indexes and dynamic formatting."""
-        tlb_table = []
-
-        vas_width = self.vasWidth
-        ph_mem_size = self.memorySize
-
-        for set_index, entries in self.tlb.full_sets.items():
-            for i, entry in enumerate(entries):
-                if entry is not None:
-                    tlb_table.append({
-                        'set': set_index,
-                        'valid': entry.validBit,
-                        'tag': f"0x{entry.tag:X}",
-                        'ppn': f"0x{entry.physicalPageAddress:X}"
-                    })
-                else:
-                    tlb_table.append({
-                        'set': set_index,
-                        'valid': 0,
-                        'tag': "--",
-                        'ppn': "--"
-                    })
-        return tlb_table
+                'tag': f"0x{entry.tag:X}",
+                'ppn': f"0x{entry.physicalPageAddress:X}"
+            }
+        return {
+            'set': set_index,
+            'valid': 0,
+            'tag': "--",
+            'ppn': "--"
+        }
 
     def formatted_string(self,width,value):
         hex_length = len(f"{value:X}")
@@ -318,11 +1219,28 @@ class Simulator:
         return formatted_string
 
 
-    def display_address_sequence(self):
+    def display_address_sequence(self, radius=None):
+        """
+        Format the address sequence, marking the current address with "> " and following each
+        address with its access type (R, W or X). Addresses are prefixed with their process
+        ("P1 ") unless they all belong to process 0. With `radius`, only the addresses within that distance of the current one are formatted;
+        memory-mapped traces always use a window so the whole trace is never decoded.
+        """
         required_digits = math.ceil(self.vasWidth // 4)
-        hex_addr = [f"0x{addr:0{required_digits}X}" for addr in self.addressSequence]
+        if radius is None and isinstance(self.addressSequence, list):
+            start, addresses = 0, self.addressSequence
+        else:
+            radius = SEQUENCE_WINDOW if radius is None else radius
+            start = max(0, self.currentAddressIndex - radius)
+            addresses = self.addressSequence[start:self.currentAddressIndex + radius + 1]
+        hex_addr = [f"0x{int(addr):0{required_digits}X} {ACCESS_TYPE_NAMES[self.access_type(index)]}"
+                    for index, addr in enumerate(addresses, start)]
+        pids = [self.process_id(index) for index in range(start, start + len(addresses))]
+        if any(pids):
+            hex_addr = [f"P{pid} {text}" for pid, text in zip(pids, hex_addr)]
+        current = self.currentAddressIndex - start
         formatted_sequence = [
-            f"> {hex_addr[self.currentAddressIndex]}" if i == self.currentAddressIndex else hex_addr[i]
+            f"> {hex_addr[current]}" if i == current else hex_addr[i]
             for i in range(len(hex_addr))
         ]
         return formatted_sequence
\ No newline at end of file
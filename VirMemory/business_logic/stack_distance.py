@@ -0,0 +1,117 @@
+"""
+LRU stack-distance (Mattson) analysis.
+
+The stack distance of an access is the number of distinct pages touched since the previous access
+to the same page, counting the page itself. LRU with C frames misses exactly when the distance is
+greater than C (or the page was never seen), so one pass over a trace gives the LRU miss count for
+every memory size at once.
+
+Run from the VirMemory directory:
+    python -m business_logic.stack_distance trace.txt --page-size 4096 --output curve.csv
+"""
+import argparse
+import csv
+
+import numpy as np
+
+from business_logic.trace import as_address_array
+from business_logic.trace_reader import read_trace_array, TRACE_FORMATS
+
+COLD = 0  # distance recorded for the first access to a page
+
+
+def stack_distances(vpns) -> np.ndarray:
+    """
+    Return the LRU stack distance of every access, COLD for first accesses. O(n log n).
+
+    A Fenwick tree over access times marks the most recent access of every page; the distance of
+    an access is one more than the number of marks after the previous access to its page.
+    """
+    vpns = vpns.tolist() if isinstance(vpns, np.ndarray) else list(vpns)
+    n = len(vpns)
+    tree = [0] * (n + 1)
+    lastAccess = {}
+    distances = [COLD] * n
+
+    for time, vpn in enumerate(vpns, 1):
+        previous = lastAccess.get(vpn)
+        if previous is not None:
+            marked = 0  # marks at or before the previous access, itself included
+            i = previous
+            while i:
+                marked += tree[i]
+                i &= i - 1
+            distances[time - 1] = len(lastAccess) - marked + 1
+            i = previous
+            while i <= n:
+                tree[i] -= 1
+                i += i & -i
+        i = time
+        while i <= n:
+            tree[i] += 1
+            i += i & -i
+        lastAccess[vpn] = time
+
+    return np.array(distances, dtype=np.int64)
+
+
+class StackDistanceProfile:
+    """Histogram of stack distances, answering LRU miss counts for any capacity."""
+
+    def __init__(self, distances: np.ndarray):
+        self.accesses = len(distances)
+        self.histogram = np.bincount(distances) if len(distances) else np.zeros(1, dtype=np.int64)
+        self.coldMisses = int(self.histogram[COLD])
+        self.distinctPages = self.coldMisses
+
+    def miss_curve(self, maxCapacity: int = None) -> np.ndarray:
+        """
+        Return curve[c] = misses of an LRU cache with c entries, for c = 0 .. maxCapacity.
+        Beyond the largest distance seen the curve stays at the cold-miss count.
+        """
+        reuses = self.histogram.copy()
+        reuses[COLD] = 0
+        curve = self.accesses - np.cumsum(reuses)
+        if maxCapacity is None:
+            return curve
+        if maxCapacity < len(curve):
+            return curve[:maxCapacity + 1]
+        return np.concatenate((curve, np.full(maxCapacity + 1 - len(curve), self.coldMisses)))
+
+    def misses(self, capacity: int) -> int:
+        """LRU misses with `capacity` entries."""
+        if capacity >= len(self.histogram):
+            return self.coldMisses
+        return int(self.accesses - self.histogram[1:capacity + 1].sum())
+
+    def __repr__(self):
+        return (f"StackDistanceProfile(accesses={self.accesses}, distinctPages={self.distinctPages}, "
+                f"maxDistance={len(self.histogram) - 1})")
+
+
+def analyze_trace(addresses, pageShift: int) -> StackDistanceProfile:
+    """Stack-distance profile of the pages touched by a trace (integers or hex strings)."""
+    vpns = as_address_array(addresses) >> np.uint64(pageShift)
+    return StackDistanceProfile(stack_distances(vpns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LRU page-fault curve for every frame count in one pass.")
+    parser.add_argument("trace", help="trace file (hex text, Lackey, raw uint64 or binary trace)")
+    parser.add_argument("--format", default="auto", choices=TRACE_FORMATS)
+    parser.add_argument("--page-size", dest="pageSize", type=int, default=4096, help="bytes")
+    parser.add_argument("--max-frames", dest="maxFrames", type=int, help="last frame count in the curve")
+    parser.add_argument("--output", default="miss_curve.csv")
+    args = parser.parse_args(argv)
+
+    profile = analyze_trace(read_trace_array(args.trace, args.format), args.pageSize.bit_length() - 1)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frames", "misses", "missRate"])
+        for frames, misses in enumerate(profile.miss_curve(args.maxFrames)):
+            writer.writerow([frames, int(misses), misses / profile.accesses if profile.accesses else 0.0])
+    print(profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Parameter sweeps: run one trace against a grid of Simulator configurations on every core.
+
+The trace, with its process IDs and access types, is decoded once in the parent and placed in
+shared memory; workers map it instead of receiving a pickled copy with every task.
+
+Run from the VirMemory directory:
+    python -m business_logic.sweep trace.txt --policy FIFO LRU --associativity 1 2 4 8 16 \\
+        --memory-size 65536 262144 --page-size 4096 16384 --output results.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from business_logic.cost_model import CostModel
+from business_logic.frame_allocation import REPLACEMENT_SCOPES, FRAME_ALLOCATORS
+from business_logic.replacement_policy import DEFAULT_WORKING_SET_WINDOW
+from business_logic.simulator import Simulator, format_size, PAGE_TABLE_MODES, PAGE_REPLACEMENT_POLICIES, HUGE_PAGE_SIZES, TLB_REPLACEMENT_POLICIES, TLB_INCLUSION_POLICIES, TLB_CONTEXT_MODES
+from business_logic.trace_file import ACCESS_READ
+from business_logic.trace_reader import read_trace_array, TRACE_FORMATS
+
+SWEEP_DEFAULTS = {
+    "policy": "LRU",
+    "vas": None,  # None: wide enough for the largest address in the trace
+    "associativity": 4,
+    "pageSize": 4096,
+    "memorySize": 64 * 1024,
+    "tlbSize": 16,
+    "pageTableMode": "sparse",  # real traces span wide address spaces; flat tables grow with them
+    "tlbPolicy": "FIFO",
+    "l2TlbSize": 0,
+    "l2TlbAssociativity": 4,
+    "tlbInclusion": "inclusive",
+    "tlbContextMode": "asid",
+    "replacementScope": "global",
+    "frameAllocator": "equal",  # frame quotas under local replacement
+    "workingSetWindow": DEFAULT_WORKING_SET_WINDOW,  # WS policy only
+    "hugePageRegions": (),  # (start address, size, huge page size) tuples
+    "costModel": None,  # CostModel latencies as a dict; None for the defaults
+}
+RESULT_FORMATS = (".csv", ".json", ".parquet")
+
+traceArray = None  # the shared trace, mapped once per worker process
+traceAccessTypes = None
+traceProcessIds = None
+traceMemory = None
+
+
+def expand_grid(grid):
+    """Turn {parameter: [values]} into one config dict per combination, filling in defaults."""
+    unknown = set(grid) - set(SWEEP_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+    names = list(SWEEP_DEFAULTS)
+    values = [grid.get(name) or [SWEEP_DEFAULTS[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def load_trace_array(trace, format="auto"):
+    """
+    Decode a trace file into (addresses, accessTypes, processIds) arrays. A trace can also be given
+    as a sequence of addresses (reads by process 0) or as an (addresses, accessTypes[, processIds]) tuple.
+    """
+    if isinstance(trace, (str, os.PathLike)):
+        return read_trace_array(trace, format, accessTypes=True, processIds=True)
+    if not isinstance(trace, tuple):
+        trace = (trace,)
+    addresses = np.asarray(trace[0], dtype=np.uint64)
+    accessTypes = trace[1] if len(trace) > 1 else np.full(len(addresses), ACCESS_READ)
+    processIds = trace[2] if len(trace) > 2 else np.zeros(len(addresses))
+    return addresses, np.asarray(accessTypes, dtype=np.uint8), np.asarray(processIds, dtype=np.uint16)
+
+
+def address_width(addresses, pageSize):
+    """Smallest virtual address width that covers every address and at least one page."""
+    largest = int(addresses.max()) if len(addresses) else 0
+    return max(largest.bit_length(), pageSize.bit_length())
+
+
+def trace_views(memory, length):
+    """
+    (addresses, accessTypes, processIds) views of a trace in a shared memory block. The addresses come
+    first, then the process IDs, then the access types, so every column stays aligned.
+    """
+    return (np.ndarray((length,), dtype=np.uint64, buffer=memory.buf),
+            np.ndarray((length,), dtype=np.uint8, buffer=memory.buf, offset=10 * length),
+            np.ndarray((length,), dtype=np.uint16, buffer=memory.buf, offset=8 * length))
+
+
+def attach_trace(name, length):
+    """Worker initializer: map the shared trace."""
+    global traceArray, traceAccessTypes, traceProcessIds, traceMemory
+    traceMemory = shared_memory.SharedMemory(name=name)
+    traceArray, traceAccessTypes, traceProcessIds = trace_views(traceMemory, length)
+
+
+def run_config(config):
+    """Run the shared trace through one configuration and return its result row."""
+    vas = config["vas"] or address_width(traceArray, config["pageSize"])
+    simulator = Simulator(config["policy"], vas, config["associativity"], config["pageSize"],
+                          config["memorySize"], config["tlbSize"], config["pageTableMode"], config["tlbPolicy"],
+                          config["l2TlbSize"], config["l2TlbAssociativity"], config["tlbInclusion"],
+                          costModel=CostModel(**(config["costModel"] or {})), tlbContextMode=config["tlbContextMode"],
+                          replacementScope=config["replacementScope"], frameAllocator=config["frameAllocator"],
+                          workingSetWindow=config["workingSetWindow"])
+    for startAddress, size, hugePageSize in config["hugePageRegions"]:
+        simulator.add_huge_page_region(startAddress, size, hugePageSize)
+    start = time.perf_counter()
+    counters = simulator.run_trace_array(traceArray, accessTypes=traceAccessTypes, processIds=traceProcessIds)
+    seconds = time.perf_counter() - start
+
+    tlbAccesses = counters["tlbHit"] + counters["tlbMiss"]
+    ptAccesses = counters["ptHit"] + counters["ptMiss"]
+    row = dict(config, vas=vas)
+    row.update(counters)
+    for level in simulator.tlb_level_stats():
+        row[f"{level['level']}Hits"] = level["hits"]
+        row[f"{level['level']}Misses"] = level["misses"]
+    for stats in simulator.page_size_stats()[1:]:
+        name = format_size(stats["pageSize"]).replace(" ", "")
+        row[f"{name}TlbMiss"] = stats["tlbMiss"]
+        row[f"{name}PtMiss"] = stats["ptMiss"]
+    row["processes"] = len(simulator.addressSpaces)
+    row["tlbHitRate"] = counters["tlbHit"] / tlbAccesses if tlbAccesses else 0.0
+    row["ptHitRate"] = counters["ptHit"] / ptAccesses if ptAccesses else 0.0
+    cost = simulator.cost_stats()
+    row["totalCycles"] = cost["totalCycles"]
+    row["effectiveAccessTime"] = cost["effectiveAccessTime"]
+    thrashing = simulator.thrashing_summary()
+    row["thrashingIntervals"] = thrashing["thrashingIntervals"]
+    row["peakFaultRate"] = thrashing["peakFaultRate"]
+    row["seconds"] = seconds
+    return row
+
+
+def run_sweep(trace, grid, workers=None, format="auto"):
+    """
+    Run every configuration of `grid` against `trace` (a path or anything load_trace_array accepts)
+    in a process pool and return one result row per configuration, in grid order.
+    """
+    configs = expand_grid(grid)
+    trace = load_trace_array(trace, format)
+    memory = shared_memory.SharedMemory(create=True, size=max(1, 11 * len(trace[0])))
+    try:
+        for view, column in zip(trace_views(memory, len(trace[0])), trace):
+            view[:] = column
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_trace,
+                                 initargs=(memory.name, len(trace[0]))) as pool:
+            return list(pool.map(run_config, configs))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def write_results(rows, path):
+    """Write result rows as CSV, JSON or Parquet, chosen by the file extension."""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported results format: {extension or path}")
+
+    if extension == ".parquet":
+        try:
+            import pandas
+        except ImportError:
+            raise ValueError("Writing Parquet results requires pandas and pyarrow") from None
+        pandas.DataFrame(rows).to_parquet(path, index=False)
+    elif extension == ".json":
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(path, "w", newline="") as f:
+            fieldnames = list(dict.fromkeys(name for row in rows for name in row)) or list(SWEEP_DEFAULTS)
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def parse_huge_region(text):
+    """Parse START:SIZE[:PAGESIZE]; each number may be decimal or 0x-prefixed hex."""
+    fields = [int(field, 0) for field in text.split(":")]
+    if len(fields) == 2:
+        fields.append(HUGE_PAGE_SIZES[0])
+    if len(fields) != 3:
+        raise argparse.ArgumentTypeError(f"Expected START:SIZE[:PAGESIZE], got {text}")
+    return tuple(fields)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a trace against a grid of simulator configurations.")
+    parser.add_argument("trace", help="trace file (hex text, Lackey, raw uint64 or binary trace)")
+    parser.add_argument("--format", default="auto", choices=TRACE_FORMATS)
+    parser.add_argument("--policy", nargs="+", choices=list(PAGE_REPLACEMENT_POLICIES))
+    parser.add_argument("--vas", nargs="+", type=int, help="virtual address width in bits")
+    parser.add_argument("--associativity", nargs="+", type=int)
+    parser.add_argument("--page-size", dest="pageSize", nargs="+", type=int, help="bytes")
+    parser.add_argument("--memory-size", dest="memorySize", nargs="+", type=int, help="bytes")
+    parser.add_argument("--tlb-size", dest="tlbSize", nargs="+", type=int)
+    parser.add_argument("--page-table-mode", dest="pageTableMode", nargs="+", choices=list(PAGE_TABLE_MODES))
+    parser.add_argument("--tlb-policy", dest="tlbPolicy", nargs="+", choices=list(TLB_REPLACEMENT_POLICIES))
+    parser.add_argument("--l2-tlb-size", dest="l2TlbSize", nargs="+", type=int, help="0 for no L2 TLB")
+    parser.add_argument("--l2-tlb-associativity", dest="l2TlbAssociativity", nargs="+", type=int)
+    parser.add_argument("--tlb-inclusion", dest="tlbInclusion", nargs="+", choices=list(TLB_INCLUSION_POLICIES))
+    parser.add_argument("--tlb-context-mode", dest="tlbContextMode", nargs="+", choices=list(TLB_CONTEXT_MODES),
+                        help="keep TLB entries across context switches (asid) or flush them")
+    parser.add_argument("--replacement-scope", dest="replacementScope", nargs="+", choices=list(REPLACEMENT_SCOPES),
+                        help="evict from any process (global) or within per-process frame quotas (local)")
+    parser.add_argument("--frame-allocator", dest="frameAllocator", nargs="+", choices=list(FRAME_ALLOCATORS))
+    parser.add_argument("--working-set-window", dest="workingSetWindow", nargs="+", type=int, help="accesses, WS policy only")
+    parser.add_argument("--huge-region", dest="hugeRegions", action="append", type=parse_huge_region,
+                        help="START:SIZE[:PAGESIZE] mapped with huge pages (2 MB by default); repeatable")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--output", default="sweep_results.csv", help=".csv, .json or .parquet")
+    args = parser.parse_args(argv)
+
+    grid = {name: getattr(args, name) for name in SWEEP_DEFAULTS if getattr(args, name, None)}
+    if args.hugeRegions:
+        grid["hugePageRegions"] = [tuple(args.hugeRegions)]
+    rows = run_sweep(args.trace, grid, args.workers, args.format)
+    write_results(rows, args.output)
+    print(f"{len(rows)} configurations written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Thrashing metrics over time: page faults, refaults and evictions per interval of accesses.
+
+A refault is a fault on a page that was evicted earlier, as opposed to a page touched for the
+first time. An interval where refaults make up a large share of the accesses is thrashing: pages
+are pushed out and needed again before they could be of use.
+"""
+import numpy as np
+
+THRASHING_INTERVAL = 1000  # accesses per interval
+THRASHING_REFAULT_RATE = 0.1  # refaults per access from which an interval counts as thrashing
+
+
+class ThrashingMonitor:
+    """
+    Events are recorded by the access number (1-based) at which they happen, in batches so the
+    fast path only has to collect those numbers.
+    """
+
+    def __init__(self, interval: int = THRASHING_INTERVAL):
+        if interval < 1:
+            raise ValueError("Thrashing interval must be at least one access.")
+        self.interval = interval
+        # Counts per interval, up to the last interval with an event
+        self.faults = np.zeros(0, dtype=np.int64)
+        self.refaultCounts = np.zeros(0, dtype=np.int64)
+        self.evictions = np.zeros(0, dtype=np.int64)
+        self.processFaults = {}  # pid -> faults per interval
+        self.quotas = {}  # interval -> {pid: frame quota set in that interval}
+        self.evictedPages = set()  # global page numbers evicted and not faulted in again since
+        self.refaults = 0
+
+    def tally(self, counts, times):
+        """Add events at access numbers `times` to the per-interval `counts`, growing them as needed."""
+        if not len(times):
+            return counts
+        bins = np.bincount((np.asarray(times, dtype=np.int64) - 1) // self.interval)
+        if len(counts) < len(bins):
+            counts = np.concatenate([counts, np.zeros(len(bins) - len(counts), dtype=np.int64)])
+        counts[:len(bins)] += bins
+        return counts
+
+    def take_evicted(self, page):
+        """True if faulting `page` in is a refault; it then stops counting as evicted."""
+        if page in self.evictedPages:
+            self.evictedPages.remove(page)
+            return True
+        return False
+
+    def record_faults(self, pid, times, refaultTimes=()):
+        """Record page faults of process `pid`, `refaultTimes` being those that were refaults."""
+        self.faults = self.tally(self.faults, times)
+        self.processFaults[pid] = self.tally(self.processFaults.get(pid, np.zeros(0, dtype=np.int64)), times)
+        self.refaultCounts = self.tally(self.refaultCounts, refaultTimes)
+        self.refaults += len(refaultTimes)
+
+    def record_evictions(self, times, pages=()):
+        """Record evictions; `pages` adds the evicted pages unless the caller already did."""
+        self.evictions = self.tally(self.evictions, times)
+        self.evictedPages.update(pages)
+
+    def record_quota(self, time, pid, quota):
+        self.quotas.setdefault((time - 1) // self.interval, {})[pid] = quota
+
+    def interval_count(self, accesses):
+        return -(-accesses // self.interval)
+
+    def stats(self, accesses, start=0, stop=None):
+        """
+        One row per interval of the first `accesses` accesses, from interval `start` to `stop`, with
+        fault and refault rates and the frame quotas in force at the end of the interval (local
+        replacement with PFF only).
+        """
+        intervals = self.interval_count(accesses)
+        stop = intervals if stop is None else min(stop, intervals)
+        rows = []
+        quotas = {}
+        for index in sorted(self.quotas):
+            if index < start:
+                quotas.update({str(pid): quota for pid, quota in self.quotas[index].items()})
+
+        def count(counts, index):
+            return int(counts[index]) if index < len(counts) else 0
+
+        for index in range(start, stop):
+            start = index * self.interval
+            length = min(self.interval, accesses - start)
+            faults = count(self.faults, index)
+            refaults = count(self.refaultCounts, index)
+            quotas = dict(quotas, **{str(pid): quota for pid, quota in self.quotas.get(index, {}).items()})
+            rows.append({
+                "start": start,
+                "accesses": length,
+                "faults": faults,
+                "refaults": refaults,
+                "evictions": count(self.evictions, index),
+                "faultRate": faults / length,
+                "refaultRate": refaults / length,
+                "thrashing": refaults / length >= THRASHING_REFAULT_RATE,
+                "processFaults": {str(pid): count(counts, index) for pid, counts in self.processFaults.items()
+                                  if count(counts, index)},
+                "quotas": quotas,
+            })
+        return rows
+
+    def summary(self, accesses):
+        """
+        Number of intervals, how many of them thrash, and the highest fault rate of any interval;
+        computed on the count arrays, as there can be far too many intervals to build their rows.
+        """
+        intervals = self.interval_count(accesses)
+        lengths = np.minimum(self.interval, accesses - np.arange(intervals) * self.interval)
+
+        def padded(counts):
+            return np.concatenate([counts[:intervals], np.zeros(max(0, intervals - len(counts)), dtype=np.int64)])
+
+        return {
+            "intervals": intervals,
+            "thrashingIntervals": int((padded(self.refaultCounts) / lengths >= THRASHING_REFAULT_RATE).sum()),
+            "peakFaultRate": float((padded(self.faults) / lengths).max()) if intervals else 0.0,
+        }
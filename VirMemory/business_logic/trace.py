@@ -0,0 +1,120 @@
+import numpy as np
+
+# ASCII code -> hex digit value; SKIP for characters ignored around a number, INVALID for the rest
+SKIP = 16
+INVALID = 255
+CHAR_VALUES = np.full(256, INVALID, dtype=np.uint8)
+CHAR_VALUES[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10, dtype=np.uint8)
+CHAR_VALUES[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16, dtype=np.uint8)
+CHAR_VALUES[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16, dtype=np.uint8)
+CHAR_VALUES[np.frombuffer(b"xX \t\r\n", dtype=np.uint8)] = SKIP
+
+PARSE_CHUNK_SIZE = 1 << 18
+
+
+def parse_hex_addresses(addresses) -> np.ndarray:
+    """
+    Parse a sequence of hex address strings (with or without a 0x prefix) into a uint64 array.
+    The strings are joined into one buffer and decoded with array operations, not one int() call each.
+    """
+    addresses = list(addresses)
+    chunks = [parse_hex_chunk(addresses[start:start + PARSE_CHUNK_SIZE])
+              for start in range(0, len(addresses), PARSE_CHUNK_SIZE)]
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint64)
+
+
+def parse_hex_chunk(lines) -> np.ndarray:
+    """Parse one chunk of hex strings; see parse_hex_addresses."""
+    if isinstance(lines[0], bytes):
+        data = b"\n".join(lines) + b"\n"
+    else:
+        data = ("\n".join(map(str, lines)) + "\n").encode("ascii", errors="replace")
+    return parse_hex_lines(data, len(lines))
+
+
+def parse_hex_lines(data: bytes, count: int = None) -> np.ndarray:
+    """
+    Parse a buffer of newline-terminated hex addresses into a uint64 array.
+    Digits are accumulated column by column (Horner's rule) across all lines at once.
+    """
+    chars = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(chars == ord("\n"))
+    if count is not None and len(ends) != count:
+        raise ValueError("Hex addresses must not contain line breaks.")
+    if len(ends) == 0:
+        return np.zeros(0, dtype=np.uint64)
+
+    values = CHAR_VALUES[chars[:ends[-1] + 1]]
+    if (values == INVALID).any():
+        raise ValueError("Invalid hex address.")
+
+    lengths = np.diff(ends, prepend=-1)  # including the newline
+    starts = ends - lengths + 1
+    width = int(lengths.max())
+    if lengths.min() == width:
+        addresses = pack_fixed_width(values.reshape(len(ends), width)[:, :-1])
+        if addresses is not None:
+            return addresses
+
+    digitsPerLine = np.diff(np.cumsum(values < SKIP, dtype=np.int64)[ends], prepend=0)
+    if (digitsPerLine == 0).any():
+        raise ValueError("Empty hex address.")
+
+    addresses = np.zeros(len(ends), dtype=np.uint64)
+    four = np.uint64(4)
+    for j in range(width - 1):
+        digits = values[np.minimum(starts + j, ends)]
+        addresses = np.where(digits < SKIP, (addresses << four) | digits, addresses)
+
+    # More than 16 digits only fits in 64 bits with leading zeros; check those rare lines exactly
+    for line in np.flatnonzero(digitsPerLine > 16):
+        text = bytes(chars[starts[line]:ends[line]]).strip()
+        if int(text, 16) >= 1 << 64:
+            raise ValueError("Hex address does not fit in 64 bits.")
+    return addresses
+
+
+def pack_fixed_width(columns: np.ndarray):
+    """
+    Fast path for lines of equal width: pack digit pairs into bytes and read them as big-endian integers.
+    Returns None when the layout needs the general parser (separators between digits, more than 16 digits).
+    """
+    skipped = columns == SKIP
+    keep = ~skipped.all(axis=0)  # e.g. a shared "0x" prefix or "\r" suffix
+    if skipped[:, keep].any():
+        return None
+    columns = columns[:, keep]
+    while columns.shape[1] > 16 and not columns[:, 0].any():
+        columns = columns[:, 1:]
+    width = columns.shape[1]
+    if width == 0 or width > 16:
+        return None
+
+    if width % 2:
+        columns = np.hstack((np.zeros((len(columns), 1), dtype=np.uint8), columns))
+    packed = np.zeros((len(columns), 8), dtype=np.uint8)
+    packed[:, 8 - columns.shape[1] // 2:] = (columns[:, 0::2] << 4) | columns[:, 1::2]
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def as_address_array(addresses) -> np.ndarray:
+    """Return the addresses as a uint64 array, parsing them first if they are hex strings."""
+    if isinstance(addresses, np.ndarray):
+        if addresses.dtype.kind in "SU":
+            return parse_hex_addresses(addresses.tolist())
+        return addresses.astype(np.uint64, copy=False)
+    if len(addresses) and isinstance(addresses[0], (str, bytes)):
+        return parse_hex_addresses(addresses)
+    return np.asarray(addresses, dtype=np.uint64)
+
+
+def preprocess_trace(addresses, pageShift: int, numSets: int):
+    """
+    Split a whole address trace in one vectorized pass.
+    Returns (vpns, offsets, setIndices) as uint64 arrays.
+    """
+    addresses = as_address_array(addresses)
+    vpns = addresses >> np.uint64(pageShift)
+    offsets = addresses & np.uint64((1 << pageShift) - 1)
+    setIndices = vpns % np.uint64(numSets)
+    return vpns, offsets, setIndices
@@ -0,0 +1,166 @@
+"""
+Compact binary trace format.
+
+Layout (little-endian):
+    header    32 bytes: magic b"VMTRACE\\0", version u16, flags u16, reserved u32,
+              address count u64, data offset u64
+    addresses count x uint64
+    access    count x uint8 access types, present when flags has FLAG_ACCESS_TYPES
+    process   count x uint16 process IDs, present when flags has FLAG_PROCESS_IDS
+
+The addresses are memory-mapped, so opening a trace costs the same no matter how long it is
+and any window of it can be read without decoding the rest.
+"""
+import struct
+
+import numpy as np
+
+TRACE_MAGIC = b"VMTRACE\0"
+TRACE_VERSION = 1
+HEADER = struct.Struct("<8sHHIQQ")
+FLAG_ACCESS_TYPES = 0x1
+FLAG_PROCESS_IDS = 0x2
+
+ACCESS_READ = 0
+ACCESS_WRITE = 1
+ACCESS_EXECUTE = 2
+ACCESS_TYPES = {"R": ACCESS_READ, "W": ACCESS_WRITE, "X": ACCESS_EXECUTE}
+ACCESS_TYPE_NAMES = {code: name for name, code in ACCESS_TYPES.items()}
+MAX_PROCESS_ID = 0xFFFF  # process IDs are stored as uint16, and double as ASIDs in the simulator
+
+
+def is_trace_file(path) -> bool:
+    """Return True if the file starts with the binary trace magic."""
+    with open(path, "rb") as f:
+        return f.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+
+
+class TraceFile:
+    """Read-only, memory-mapped view of a binary trace file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a binary trace.")
+        magic, version, flags, _, count, dataOffset = HEADER.unpack(header)
+        if magic != TRACE_MAGIC:
+            raise ValueError(f"{path} is not a binary trace.")
+        if version != TRACE_VERSION:
+            raise ValueError(f"Unsupported binary trace version: {version}")
+
+        self.count = count
+        self.flags = flags
+        self.addresses = self.map_array(np.dtype("<u8"), dataOffset)
+        self.accessTypes = None
+        self.processIds = None
+        offset = dataOffset + 8 * count
+        if flags & FLAG_ACCESS_TYPES:
+            self.accessTypes = self.map_array(np.dtype(np.uint8), offset)
+            offset += count
+        if flags & FLAG_PROCESS_IDS:
+            self.processIds = self.map_array(np.dtype("<u2"), offset)
+
+    def map_array(self, dtype, offset):
+        if self.count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(self.count,))
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        # Pickled by path, so copies map the file again instead of carrying its contents
+        return TraceFile, (self.path,)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.addresses[index]
+        return int(self.addresses[index])
+
+    def window(self, center: int, radius: int):
+        """Return (start, addresses) for the addresses within `radius` of index `center`."""
+        start = max(0, center - radius)
+        return start, self.addresses[start:min(self.count, center + radius + 1)]
+
+    def chunks(self, chunkSize: int, start: int = 0):
+        """Yield consecutive zero-copy slices of the addresses, beginning at index `start`."""
+        for chunkStart in range(start, self.count, chunkSize):
+            yield self.addresses[chunkStart:chunkStart + chunkSize]
+
+    def records(self, chunkSize: int, start: int = 0):
+        """Like chunks, but yield (addresses, accessTypes, processIds); a column the file lacks is None."""
+        for chunkStart in range(start, self.count, chunkSize):
+            stop = chunkStart + chunkSize
+            yield (self.addresses[chunkStart:stop],
+                   None if self.accessTypes is None else self.accessTypes[chunkStart:stop],
+                   None if self.processIds is None else self.processIds[chunkStart:stop])
+
+    def __repr__(self):
+        return (f"TraceFile(path={self.path!r}, count={self.count}, accessTypes={self.accessTypes is not None}, "
+                f"processIds={self.processIds is not None})")
+
+
+def write_trace_file(path, chunks, accessTypeChunks=None, processIdChunks=None):
+    """
+    Write address chunks (iterables of integers or uint64 arrays) to a binary trace file.
+    `accessTypeChunks` and `processIdChunks`, if given, must line up with `chunks`; they are only
+    iterated after `chunks` is exhausted, and a column that yields nothing is left out.
+    Returns the number of addresses written.
+    """
+    flags = 0
+    count = 0
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, flags, 0, 0, HEADER.size))
+        for chunk in chunks:
+            chunk = np.asarray(chunk, dtype="<u8")
+            f.write(chunk.tobytes())
+            count += len(chunk)
+        columns = ((accessTypeChunks, np.uint8, FLAG_ACCESS_TYPES, "Access types"),
+                   (processIdChunks, "<u2", FLAG_PROCESS_IDS, "Process IDs"))
+        for columnChunks, dtype, flag, name in columns:
+            if columnChunks is None:
+                continue
+            written = 0
+            for chunk in columnChunks:
+                chunk = np.asarray(chunk, dtype=dtype)
+                f.write(chunk.tobytes())
+                written += len(chunk)
+            if written:
+                flags |= flag
+            if written and written != count:
+                raise ValueError(f"{name} do not line up with the addresses.")
+        f.seek(0)
+        f.write(HEADER.pack(TRACE_MAGIC, TRACE_VERSION, flags, 0, count, HEADER.size))
+    return count
+
+
+def convert_trace(sourcePath, destinationPath, format="auto", progress=None):
+    """
+    Convert a text, Lackey or raw trace to the binary format once, so later runs skip parsing.
+    Access types and process IDs are kept if the source has them; they are small next to the
+    addresses, so they are buffered until the addresses have been written. `progress`, if given,
+    is called with the number of addresses converted so far after every chunk.
+    """
+    from business_logic.trace_reader import read_trace_chunks, DEFAULT_CHUNK_SIZE
+    lengths = []
+    accessTypeChunks = []
+    processIdChunks = []
+
+    def addressChunks():
+        for addresses, accessTypes, processIds in read_trace_chunks(sourcePath, format, DEFAULT_CHUNK_SIZE, 0):
+            lengths.append(len(addresses))
+            accessTypeChunks.append(accessTypes)
+            processIdChunks.append(processIds)
+            yield addresses
+            if progress is not None:
+                progress(sum(lengths))
+
+    def columnChunks(chunks, default):
+        if any(chunk is not None for chunk in chunks):
+            for length, chunk in zip(lengths, chunks):
+                yield np.full(length, default) if chunk is None else chunk
+
+    return write_trace_file(destinationPath, addressChunks(), columnChunks(accessTypeChunks, ACCESS_READ),
+                            columnChunks(processIdChunks, 0))
@@ -0,0 +1,236 @@
+import gzip
+
+import numpy as np
+
+from business_logic.trace import parse_hex_lines
+from business_logic.trace_file import TraceFile, is_trace_file, ACCESS_READ, ACCESS_WRITE, ACCESS_EXECUTE, ACCESS_TYPES, MAX_PROCESS_ID
+
+TRACE_FORMATS = ("auto", "hex", "lackey", "process", "binary", "vmt")
+BINARY_EXTENSIONS = (".bin", ".u64", ".raw")
+GZIP_MAGIC = b"\x1f\x8b"
+DEFAULT_CHUNK_SIZE = 1 << 16
+HEX_LINE_BYTES = 16  # average bytes per text line, used to size reads
+# Lackey records: "I  04010173,3" instruction fetch, " L", " S", " M" data load, store and modify
+LACKEY_KINDS = {b"I": ACCESS_EXECUTE, b"L": ACCESS_READ, b"S": ACCESS_WRITE, b"M": ACCESS_WRITE}
+# Optional access type before the address on a hex text line, e.g. "W 0x7ffd1000"
+HEX_KINDS = {name.encode(): code for name, code in ACCESS_TYPES.items()}
+
+
+def open_trace(path):
+    """Open a trace file for binary reading, decompressing it on the fly if it is gzipped."""
+    with open(path, "rb") as probe:
+        magic = probe.read(2)
+    if magic == GZIP_MAGIC:
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def detect_format(path, stream):
+    """Guess the trace format from the file name and the first bytes of the (decompressed) stream."""
+    name = str(path).lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(BINARY_EXTENSIONS):
+        return "binary"
+
+    head = stream.peek(4096)[:4096] if hasattr(stream, "peek") else b""
+    for line in head.splitlines():
+        if not line.strip() or line.startswith(b"==") or line.lstrip().startswith(b"#"):
+            continue
+        fields = line.split()
+        if fields[0] in LACKEY_KINDS and len(fields) == 2 and b"," in fields[1]:
+            return "lackey"
+        if fields[0].isdigit() and (len(fields) == 2 or (len(fields) == 3 and fields[1] in HEX_KINDS)):
+            return "process"
+        return "hex"
+    return "hex"
+
+
+def read_trace(path, format="auto", chunkSize=DEFAULT_CHUNK_SIZE, start=0, accessTypes=False, processIds=False):
+    """
+    Stream the addresses of a trace file as uint64 NumPy arrays of about `chunkSize` addresses.
+    Supports hex text (one address per line, optionally preceded by R, W or X), Valgrind Lackey
+    output, multi-process text traces and raw little-endian uint64 dumps, each optionally
+    gzip-compressed, plus the memory-mapped binary format of trace_file.
+    Only one chunk is held in memory at a time. The first `start` addresses are skipped; binary
+    trace files seek straight to them, the other formats still have to read past them.
+    With `accessTypes` and/or `processIds`, tuples of the addresses followed by the requested
+    columns are yielded instead: uint8 ACCESS_* codes (reads if the trace has no types) and
+    uint16 process IDs (process 0 if the trace has none).
+    """
+    for addresses, types, pids in read_trace_chunks(path, format, chunkSize, start):
+        if not accessTypes and not processIds:
+            yield addresses
+            continue
+        record = (addresses,)
+        if accessTypes:
+            record += (np.full(len(addresses), ACCESS_READ, dtype=np.uint8) if types is None else types,)
+        if processIds:
+            record += (np.zeros(len(addresses), dtype=np.uint16) if pids is None else pids,)
+        yield record
+
+
+def read_trace_chunks(path, format, chunkSize, start):
+    """Yield (addresses, accessTypes, processIds) chunks; a column the trace lacks is None."""
+    if format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {format}")
+
+    if format == "vmt" or (format == "auto" and is_trace_file(path)):
+        yield from TraceFile(path).records(chunkSize, start)
+        return
+    if start:
+        yield from skip_addresses(read_trace_chunks(path, format, chunkSize, 0), start)
+        return
+
+    with open_trace(path) as stream:
+        if format == "auto":
+            format = detect_format(path, stream)
+        if format == "binary":
+            yield from read_binary_chunks(stream, chunkSize)
+        elif format == "lackey":
+            yield from read_lackey_chunks(stream, chunkSize)
+        elif format == "process":
+            yield from read_process_chunks(stream, chunkSize)
+        else:
+            yield from read_hex_chunks(stream, chunkSize)
+
+
+def read_trace_array(path, format="auto", accessTypes=False, processIds=False):
+    """
+    Read a whole trace file into one uint64 array, or, with `accessTypes` and/or `processIds`,
+    a tuple of arrays as yielded by read_trace.
+    """
+    chunks = list(read_trace(path, format, accessTypes=accessTypes, processIds=processIds))
+    if not accessTypes and not processIds:
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint64)
+    dtypes = [np.uint64] + [np.uint8] * accessTypes + [np.uint16] * processIds
+    if not chunks:
+        return tuple(np.zeros(0, dtype=dtype) for dtype in dtypes)
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def skip_addresses(chunks, count):
+    """Drop the first `count` addresses of a stream of (addresses, accessTypes, processIds) chunks."""
+    for chunk in chunks:
+        if count >= len(chunk[0]):
+            count -= len(chunk[0])
+            continue
+        yield tuple(None if column is None else column[count:] for column in chunk)
+        count = 0
+
+
+def read_binary_chunks(stream, chunkSize):
+    """Yield chunks of a raw little-endian uint64 address dump."""
+    remainder = b""
+    while True:
+        block = stream.read(chunkSize * 8)
+        if not block:
+            break
+        block = remainder + block
+        usable = len(block) - len(block) % 8
+        remainder = block[usable:]
+        if usable:
+            yield np.frombuffer(block, dtype="<u8", count=usable // 8).astype(np.uint64), None, None
+    if remainder:
+        raise ValueError("Binary trace length is not a multiple of 8 bytes.")
+
+
+def read_hex_chunks(stream, chunkSize):
+    """Yield (addresses, accessTypes) chunks of a text trace with one hex address per line."""
+    remainder = b""
+    while True:
+        block = stream.read(chunkSize * HEX_LINE_BYTES)
+        if not block:
+            break
+        block = remainder + block
+        cut = block.rfind(b"\n") + 1
+        remainder = block[cut:]
+        if cut:
+            yield parse_hex_block(block[:cut]) + (None,)
+    if remainder.strip():
+        yield parse_hex_block(remainder + b"\n") + (None,)
+
+
+def parse_hex_block(block):
+    """
+    Parse whole lines of hex addresses into (addresses, accessTypes); blank lines and '#' comments
+    are skipped. The types are None unless some line starts with an access type.
+    """
+    try:
+        return parse_hex_lines(block), None
+    except ValueError:
+        lines = [line.split() for line in block.split(b"\n")]
+        lines = [fields for fields in lines if fields and not fields[0].startswith(b"#")]
+        if not lines:
+            return np.zeros(0, dtype=np.uint64), None
+        if all(len(fields) == 1 for fields in lines):
+            return parse_hex_lines(b"\n".join(fields[0] for fields in lines) + b"\n", len(lines)), None
+
+        types = np.empty(len(lines), dtype=np.uint8)
+        for i, fields in enumerate(lines):
+            if len(fields) == 1:
+                types[i] = ACCESS_READ
+            elif len(fields) == 2 and fields[0] in HEX_KINDS:
+                types[i] = HEX_KINDS[fields[0]]
+            else:
+                raise ValueError(f"Invalid trace line: {b' '.join(fields).decode(errors='replace')}")
+        addresses = parse_hex_lines(b"\n".join(fields[-1] for fields in lines) + b"\n", len(lines))
+        return addresses, types
+
+
+def read_lackey_chunks(stream, chunkSize):
+    """
+    Yield (addresses, accessTypes) chunks of Valgrind Lackey (--trace-mem=yes) output.
+    Instruction fetches are executes, loads are reads, and stores and modifies are writes.
+    """
+    addresses = np.empty(chunkSize, dtype=np.uint64)
+    types = np.empty(chunkSize, dtype=np.uint8)
+    count = 0
+    for line in stream:
+        fields = line.split()
+        if len(fields) != 2:
+            continue
+        kind = LACKEY_KINDS.get(fields[0])
+        if kind is None:
+            continue  # "==pid==" banner lines and anything else that is not an access
+        addresses[count] = int(fields[1].split(b",", 1)[0], 16)
+        types[count] = kind
+        count += 1
+        if count == chunkSize:
+            yield addresses.copy(), types.copy(), None
+            count = 0
+    if count:
+        yield addresses[:count].copy(), types[:count].copy(), None
+
+
+def read_process_chunks(stream, chunkSize):
+    """
+    Yield (addresses, accessTypes, processIds) chunks of a multi-process text trace, one access per
+    line as "PID [R|W|X] ADDRESS" with the PID in decimal and the address in hex, e.g. "2 W 0x7ffd1000".
+    """
+    addresses = np.empty(chunkSize, dtype=np.uint64)
+    types = np.empty(chunkSize, dtype=np.uint8)
+    pids = np.empty(chunkSize, dtype=np.uint16)
+    count = 0
+    for line in stream:
+        fields = line.split()
+        if not fields or fields[0].startswith(b"#"):
+            continue
+        if len(fields) == 2:
+            kind = ACCESS_READ
+        elif len(fields) == 3 and fields[1] in HEX_KINDS:
+            kind = HEX_KINDS[fields[1]]
+        else:
+            raise ValueError(f"Invalid trace line: {line.strip().decode(errors='replace')}")
+        pid = int(fields[0])
+        if not 0 <= pid <= MAX_PROCESS_ID:
+            raise ValueError(f"Process ID {pid} is outside 0..{MAX_PROCESS_ID}.")
+        pids[count] = pid
+        types[count] = kind
+        addresses[count] = int(fields[-1], 16)
+        count += 1
+        if count == chunkSize:
+            yield addresses.copy(), types.copy(), pids.copy()
+            count = 0
+    if count:
+        yield addresses[:count].copy(), types[:count].copy(), pids[:count].copy()
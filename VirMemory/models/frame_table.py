@@ -0,0 +1,39 @@
+class FrameTable:
+    def __init__(self, numFrames: int):
+        self.numFrames = numFrames
+        self.usedFrames = bytearray(numFrames)  # 1 if the frame holds a page
+        self.freeFrames = []  # released frames, handed out again first
+        self.nextFrame = 0  # frames from here on have never been handed out
+        self.usedCount = 0
+
+    def allocate(self) -> int:
+        """Mark a free frame as used and return it, or -1 if none are available."""
+        if self.freeFrames:
+            frame = self.freeFrames.pop()
+        elif self.nextFrame < self.numFrames:
+            frame = self.nextFrame
+            self.nextFrame += 1
+        else:
+            return -1
+        self.usedFrames[frame] = 1
+        self.usedCount += 1
+        return frame
+
+    def release(self, frame: int):
+        """Return a frame to the free list."""
+        if self.usedFrames[frame]:
+            self.usedFrames[frame] = 0
+            self.freeFrames.append(frame)
+            self.usedCount -= 1
+
+    def is_full(self) -> bool:
+        return self.usedCount == self.numFrames
+
+    def __getitem__(self, frame: int) -> bool:
+        return bool(self.usedFrames[frame])
+
+    def __len__(self):
+        return self.numFrames
+
+    def __repr__(self):
+        return f"FrameTable(numFrames={self.numFrames}, usedCount={self.usedCount})"
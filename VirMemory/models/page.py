@@ -1,51 +1,415 @@
+import math
+from array import array
+from bisect import bisect_right
+
+PAGE_ENTRY_BYTES = 160  # a Page object plus the slot that holds it
 
 
 class Page:
+    __slots__ = ("validBit", "frame", "index", "dirtyBit", "referencedBit")
+
     def __init__(self, index: int):
         self.validBit = False
         self.frame = -1
         self.index = index
+        self.dirtyBit = False
+        self.referencedBit = False
+
+    def __repr__(self):
+        return f"validBit={self.validBit}, frame={self.frame}, index={self.index}, dirtyBit={self.dirtyBit})"
+
+class HugePageRegion:
+    """VPNs [startVpn, endVpn) mapped with huge pages of `pageSize` bytes, `shift` VPN bits each."""
+    __slots__ = ("startVpn", "endVpn", "pageSize", "shift")
+
+    def __init__(self, startVpn: int, endVpn: int, pageSize: int, shift: int):
+        self.startVpn = startVpn
+        self.endVpn = endVpn
+        self.pageSize = pageSize
+        self.shift = shift
 
     def __repr__(self):
-        return f"validBit={self.validBit}, frame={self.frame}, index={self.index})"
+        return f"HugePageRegion(startVpn=0x{self.startVpn:X}, endVpn=0x{self.endVpn:X}, pageSize={self.pageSize})"
+
 
 class PageTable:
+    """Flat page table stored as a struct of arrays, one slot per VPN."""
+
     def __init__(self, numPages: int, pageSize: int):
         self.numPages = numPages
-        self.pages = [Page(index=i) for i in range(numPages)]
+        self.levels = 1  # tables read by a page walk
+        self.validBits = bytearray(numPages)
+        self.frames = array("i", [-1]) * numPages
+        self.dirtyBits = bytearray(numPages)
+        self.referencedBits = bytearray(numPages)
+        self.pages = PageArray(self)
         self.pageFaults = 0
+        self.writeBacks = 0  # evictions of dirty pages, written back to secondary memory
+        self.cleanEvictions = 0
         self.pageSize = pageSize
+        self.init_huge_pages()
 
-    def get_available_frame(self, frameTable):
-        """Return the first free frame, or -1 if none are available."""
-        for i in range(len(frameTable)):
-            if not frameTable[i]:
-                return i
+    def init_huge_pages(self):
+        self.hugeRegions = []  # sorted by startVpn, non-overlapping
+        self.hugeRegionStarts = []
+        self.hugeSpan = (0, 0)  # no VPN outside [low, high) is in a huge region
+        self.hugeMappings = {}  # huge page size -> {huge VPN: huge frame}
+
+    def add_huge_region(self, startVpn, endVpn, pageSize, shift):
+        """Mark VPNs [startVpn, endVpn) as mapped by huge pages (like a PMD/PUD leaf entry)."""
+        position = bisect_right(self.hugeRegionStarts, startVpn)
+        if position and self.hugeRegions[position - 1].endVpn > startVpn:
+            raise ValueError("Huge page regions must not overlap.")
+        if position < len(self.hugeRegions) and self.hugeRegions[position].startVpn < endVpn:
+            raise ValueError("Huge page regions must not overlap.")
+        region = HugePageRegion(startVpn, endVpn, pageSize, shift)
+        self.hugeRegions.insert(position, region)
+        self.hugeRegionStarts.insert(position, startVpn)
+        self.hugeSpan = (self.hugeRegions[0].startVpn, self.hugeRegions[-1].endVpn)
+        self.hugeMappings.setdefault(pageSize, {})
+        return region
+
+    def huge_region(self, pageIndex):
+        """Return the huge page region containing a VPN, or None if it is mapped with base pages."""
+        position = bisect_right(self.hugeRegionStarts, pageIndex) - 1
+        if position >= 0 and pageIndex < self.hugeRegions[position].endVpn:
+            return self.hugeRegions[position]
+        return None
+
+    def walk_levels(self, shift=0):
+        """Page table levels read by a walk for a page of 2**shift base pages."""
+        return self.levels
+
+    def translate_huge(self, hugePageIndex, pageSize):
+        """Return the frame of a huge page, or -1 if it has not been touched yet."""
+        return self.hugeMappings[pageSize].get(hugePageIndex, -1)
+
+    def map_huge_page(self, hugePageIndex, frame, pageSize):
+        self.hugeMappings[pageSize][hugePageIndex] = frame
+
+    def translate(self, pageIndex):
+        """Return the frame holding a page and mark it referenced, or -1 if the page is not resident."""
+        if self.validBits[pageIndex]:
+            self.referencedBits[pageIndex] = 1
+            return self.frames[pageIndex]
         return -1
 
-    def page_evict(self, pageIndex, frameTable, tlb):
-        """Evict a page and update the frame table and TLB."""
-        page = self.pages[pageIndex]
-        frameIndex = page.frame
+    def map_page(self, pageIndex, frame):
+        """Load a page into a frame."""
+        self.validBits[pageIndex] = 1
+        self.frames[pageIndex] = frame
+        self.dirtyBits[pageIndex] = 0
+        self.referencedBits[pageIndex] = 1
+
+    def mark_dirty(self, pageIndex):
+        """Record a write to a resident page."""
+        self.dirtyBits[pageIndex] = 1
+
+    def rows(self, start, stop):
+        """Yield (vpn, validBit, frame, dirtyBit) for the VPNs in [start, stop)."""
+        frames = self.frames
+        validBits = self.validBits
+        dirtyBits = self.dirtyBits
+        for vpn in range(start, stop):
+            yield vpn, bool(validBits[vpn]), frames[vpn], bool(dirtyBits[vpn])
+
+    def memory_size(self):
+        """Approximate bytes held by the entries."""
+        return len(self.validBits) + len(self.dirtyBits) + len(self.referencedBits) + self.frames.itemsize * len(self.frames)
+
+    def valid_rows(self, start, stop):
+        """Like rows(), but only for the valid pages, found without visiting the others one by one."""
+        validBits = self.validBits
+        vpn = validBits.find(1, start, stop)
+        while vpn != -1:
+            yield vpn, True, self.frames[vpn], bool(self.dirtyBits[vpn])
+            vpn = validBits.find(1, vpn + 1, stop)
+
+    def peek(self, pageIndex):
+        """Return the entry for a page without materializing it, or None if it was never touched."""
+        return self.pages[pageIndex]
+
+    def get_available_frame(self, frameTable):
+        """Allocate a free frame from the frame table, or return -1 if none are available."""
+        return frameTable.allocate()
+
+    def page_evict(self, pageIndex, frameTable, tlb, tlbTag=None):
+        """
+        Evict a page, writing it back first if it is dirty, and update the frame table and TLB.
+        `tlbTag` is the page's TLB tag when it differs from the VPN (see AddressSpaces).
+        """
+        frameIndex = self.frames[pageIndex]
         if frameIndex != -1:
-            frameTable[frameIndex] = False
-        page.validBit = False
-        tlb_invalid_entry = tlb.invalidate_entry(pageIndex)
+            frameTable.release(frameIndex)
+        if self.dirtyBits[pageIndex]:
+            self.writeBacks += 1
+            self.dirtyBits[pageIndex] = 0
+        else:
+            self.cleanEvictions += 1
+        self.validBits[pageIndex] = 0
+        self.referencedBits[pageIndex] = 0
+        tlb_invalid_entry = tlb.invalidate_entry(pageIndex if tlbTag is None else tlbTag)
         return [tlb_invalid_entry,frameIndex]
 
-    def access_page(self, pageIndex, frameTable, tlb, replacementPolicy):
+    def access_page(self, pageIndex, frameTable, tlb, replacementPolicy, write=False):
         """Access a page, updating page table, TLB, and frame table."""
-        page = self.pages[pageIndex]
-        if page.validBit:
-            return page.frame
+        frame = self.translate(pageIndex)
+        if frame != -1:
+            if write:
+                self.mark_dirty(pageIndex)
+            return frame
         else:
             self.pageFaults += 1
             freeFrame = self.get_available_frame(frameTable)
 
             if freeFrame == -1:
+                replacementPolicy.prepare_replacement(pageIndex)
                 replacementPolicy.replace_page(self, frameTable, tlb)
+                freeFrame = self.get_available_frame(frameTable)
 
-            page.validBit = True
-            frameTable[freeFrame] = True
-            page.frame = freeFrame
+            self.map_page(pageIndex, freeFrame)
+            if write:
+                self.mark_dirty(pageIndex)
             return freeFrame
+
+
+class PageArray:
+    """Sequence view over a flat PageTable; pages[vpn] returns a PageView of that slot."""
+
+    def __init__(self, pageTable: PageTable):
+        self.pageTable = pageTable
+
+    def __getitem__(self, vpn: int):
+        if not 0 <= vpn < self.pageTable.numPages:
+            raise IndexError(f"VPN 0x{vpn:X} is outside the virtual address space")
+        return PageView(self.pageTable, vpn)
+
+    def __len__(self):
+        return self.pageTable.numPages
+
+
+class PageView:
+    """Page-like accessor that reads and writes one slot of a flat PageTable's arrays."""
+    __slots__ = ("pageTable", "index")
+
+    def __init__(self, pageTable: PageTable, index: int):
+        self.pageTable = pageTable
+        self.index = index
+
+    @property
+    def validBit(self):
+        return bool(self.pageTable.validBits[self.index])
+
+    @validBit.setter
+    def validBit(self, value):
+        self.pageTable.validBits[self.index] = 1 if value else 0
+
+    @property
+    def frame(self):
+        return self.pageTable.frames[self.index]
+
+    @frame.setter
+    def frame(self, value):
+        self.pageTable.frames[self.index] = value
+
+    @property
+    def dirtyBit(self):
+        return bool(self.pageTable.dirtyBits[self.index])
+
+    @dirtyBit.setter
+    def dirtyBit(self, value):
+        self.pageTable.dirtyBits[self.index] = 1 if value else 0
+
+    @property
+    def referencedBit(self):
+        return bool(self.pageTable.referencedBits[self.index])
+
+    @referencedBit.setter
+    def referencedBit(self, value):
+        self.pageTable.referencedBits[self.index] = 1 if value else 0
+
+    def __repr__(self):
+        return f"validBit={self.validBit}, frame={self.frame}, index={self.index}, dirtyBit={self.dirtyBit})"
+
+
+class SparsePageTable(PageTable):
+    """Page table that only materializes Page entries for touched VPNs."""
+
+    def __init__(self, numPages: int, pageSize: int):
+        self.numPages = numPages
+        self.levels = 1
+        self.pages = self.build_pages()
+        self.pageFaults = 0
+        self.writeBacks = 0
+        self.cleanEvictions = 0
+        self.pageSize = pageSize
+        self.init_huge_pages()
+
+    def build_pages(self):
+        return SparsePages(self.numPages)
+
+    def translate(self, pageIndex):
+        page = self.pages[pageIndex]
+        if page.validBit:
+            page.referencedBit = True
+            return page.frame
+        return -1
+
+    def map_page(self, pageIndex, frame):
+        page = self.pages[pageIndex]
+        page.validBit = True
+        page.frame = frame
+        page.dirtyBit = False
+        page.referencedBit = True
+
+    def mark_dirty(self, pageIndex):
+        self.pages[pageIndex].dirtyBit = True
+
+    def rows(self, start, stop):
+        get = self.pages.get
+        for vpn in range(start, stop):
+            page = get(vpn)
+            if page is None:
+                yield vpn, False, -1, False
+            else:
+                yield vpn, page.validBit, page.frame, page.dirtyBit
+
+    def memory_size(self):
+        return self.pages.memory_size()
+
+    def valid_rows(self, start, stop):
+        for vpn, page in self.pages.items(start, stop):
+            if page.validBit:
+                yield vpn, True, page.frame, page.dirtyBit
+
+    def peek(self, pageIndex):
+        return self.pages.get(pageIndex)
+
+    def page_evict(self, pageIndex, frameTable, tlb, tlbTag=None):
+        page = self.pages[pageIndex]
+        frameIndex = page.frame
+        if frameIndex != -1:
+            frameTable.release(frameIndex)
+        if page.dirtyBit:
+            self.writeBacks += 1
+            page.dirtyBit = False
+        else:
+            self.cleanEvictions += 1
+        page.validBit = False
+        page.referencedBit = False
+        tlb_invalid_entry = tlb.invalidate_entry(pageIndex if tlbTag is None else tlbTag)
+        return [tlb_invalid_entry,frameIndex]
+
+
+class RadixPageTable(SparsePageTable):
+    """Multi-level page table like x86-64's, with tables allocated on the first walk through them."""
+
+    def __init__(self, numPages: int, pageSize: int, bitsPerLevel: int = 9):
+        self.bitsPerLevel = bitsPerLevel
+        super().__init__(numPages, pageSize)
+        self.levels = self.pages.levels
+
+    def build_pages(self):
+        return RadixPages(self.numPages, self.bitsPerLevel)
+
+    def walk_levels(self, shift=0):
+        """Huge pages are leaves higher up the tree (a 2 MB page ends the x86-64 walk one level early)."""
+        return max(1, self.levels - shift // self.bitsPerLevel)
+
+
+class SparsePages:
+    """VPN -> Page mapping that creates entries on first access."""
+
+    def __init__(self, numPages: int):
+        self.numPages = numPages
+        self.entries = {}
+
+    def __getitem__(self, vpn: int) -> Page:
+        page = self.entries.get(vpn)
+        if page is None:
+            if not 0 <= vpn < self.numPages:
+                raise IndexError(f"VPN 0x{vpn:X} is outside the virtual address space")
+            page = self.entries[vpn] = Page(index=vpn)
+        return page
+
+    def get(self, vpn: int):
+        return self.entries.get(vpn)
+
+    def memory_size(self):
+        return len(self.entries) * PAGE_ENTRY_BYTES
+
+    def items(self, start, stop):
+        """Yield (vpn, page) for the entries created in [start, stop), in VPN order."""
+        for vpn in sorted(vpn for vpn in self.entries if start <= vpn < stop):
+            yield vpn, self.entries[vpn]
+
+    def __len__(self):
+        return self.numPages
+
+
+class RadixPages:
+    """
+    Radix tree of page tables. Each level is indexed by `bitsPerLevel` bits of the VPN,
+    most significant first; the last level holds the Page entries.
+    """
+
+    def __init__(self, numPages: int, bitsPerLevel: int):
+        self.numPages = numPages
+        vpnBits = max(1, (numPages - 1).bit_length())
+        self.levels = math.ceil(vpnBits / bitsPerLevel)
+        self.fanout = 1 << bitsPerLevel
+        self.shifts = [bitsPerLevel * level for level in range(self.levels - 1, 0, -1)]
+        self.root = [None] * self.fanout
+        self.tableCount = 1
+        self.entryCount = 0
+
+    def walk(self, vpn: int, create: bool):
+        """Walk the tree down to the entry for `vpn`, allocating missing tables if `create` is set."""
+        mask = self.fanout - 1
+        node = self.root
+        for shift in self.shifts:
+            slot = (vpn >> shift) & mask
+            child = node[slot]
+            if child is None:
+                if not create:
+                    return None
+                child = node[slot] = [None] * self.fanout
+                self.tableCount += 1
+            node = child
+
+        slot = vpn & mask
+        page = node[slot]
+        if page is None and create:
+            page = node[slot] = Page(index=vpn)
+            self.entryCount += 1
+        return page
+
+    def __getitem__(self, vpn: int) -> Page:
+        if not 0 <= vpn < self.numPages:
+            raise IndexError(f"VPN 0x{vpn:X} is outside the virtual address space")
+        return self.walk(vpn, True)
+
+    def get(self, vpn: int):
+        return self.walk(vpn, False)
+
+    def memory_size(self):
+        return self.tableCount * self.fanout * 8 + self.entryCount * PAGE_ENTRY_BYTES
+
+    def items(self, start, stop):
+        """Yield (vpn, page) for the entries created in [start, stop), in VPN order, skipping missing tables."""
+        def visit(node, base, shifts):
+            if not shifts:
+                for slot in range(max(0, start - base), min(self.fanout, stop - base)):
+                    if node[slot] is not None:
+                        yield base + slot, node[slot]
+                return
+            shift = shifts[0]
+            for slot in range(max(0, (start - base) >> shift), min(self.fanout, ((stop - 1 - base) >> shift) + 1)):
+                if node[slot] is not None:
+                    yield from visit(node[slot], base + (slot << shift), shifts[1:])
+
+        if start < stop:
+            yield from visit(self.root, 0, self.shifts)
+
+    def __len__(self):
+        return self.numPages
@@ -0,0 +1,49 @@
+class Process:
+    """A process: its own page table plus the counters of the accesses it made."""
+
+    def __init__(self, pid: int, pageTable, replacementPolicy=None, quota: int = 0):
+        self.pid = pid
+        self.pageTable = pageTable
+        self.replacementPolicy = replacementPolicy  # shared by every process under global replacement
+        self.counters = {"tlbHit": 0, "tlbMiss": 0, "ptHit": 0, "ptMiss": 0}
+        self.switchIns = 0  # context switches to this process
+        self.residentPages = 0  # base pages of this process held in frames
+        self.quota = quota  # frames it may hold under local replacement (see frame_allocation)
+        self.lastFaultTime = 0  # virtual time of its last page fault
+
+    def __repr__(self):
+        return f"Process(pid={self.pid}, counters={self.counters})"
+
+
+class AddressSpaces:
+    """
+    The page tables of every process, addressed by global page number: the process ID (used as
+    the ASID) above the VPN bits. Replacement policies and TLBs key their entries by global page
+    number, so pages of different processes never collide; this class routes a policy's eviction
+    back to the page table that owns the page.
+    """
+
+    def __init__(self, vpnBits: int):
+        self.vpnBits = vpnBits
+        self.vpnMask = (1 << vpnBits) - 1
+        self.processes = {}  # pid -> Process, in order of first use
+
+    def global_page(self, pid: int, vpn: int) -> int:
+        return (pid << self.vpnBits) | vpn
+
+    def split(self, pageIndex: int):
+        """Return (pid, vpn) of a global page number."""
+        return pageIndex >> self.vpnBits, pageIndex & self.vpnMask
+
+    def page_evict(self, pageIndex, frameTable, tlb):
+        """Evict a page of any process; the TLB entry to invalidate is tagged with the global page number."""
+        pid, vpn = self.split(pageIndex)
+        process = self.processes[pid]
+        process.residentPages -= 1
+        return process.pageTable.page_evict(vpn, frameTable, tlb, pageIndex)
+
+    def page_tables(self):
+        return [process.pageTable for process in self.processes.values()]
+
+    def __len__(self):
+        return len(self.processes)
@@ -1,7 +1,11 @@
+import random
+from abc import ABC, abstractmethod
 from typing import Optional
 
 
 class TLBEntry:
+    __slots__ = ("validBit", "tag", "physicalPageAddress")
+
     def __init__(self, tag: int, physicalPageAddress: int):
         self.validBit = True
         self.tag = tag
@@ -9,62 +13,329 @@ class TLBEntry:
 
     def __repr__(self):
         return f"TLBEntry(tag={self.tag}, physicalPageAddress={self.physicalPageAddress}, validBit={self.validBit})"
-from collections import deque
+from collections import OrderedDict
+
+
+class TLBReplacementPolicy(ABC):
+    """
+    Chooses the way to evict when a TLB set is full. Entries are identified by their global
+    index in the TLB (set * associativity + way); only valid entries are tracked.
+    """
+    name = ""
+    tracksHits = True  # False if hits do not change the eviction order, so lookups can skip touch()
+
+    def __init__(self, numSets: int, associativity: int):
+        self.numSets = numSets
+        self.associativity = associativity
+
+    @abstractmethod
+    def fill(self, set_index: int, entry_index: int):
+        """An entry of the set has just been filled."""
+        pass
+
+    @abstractmethod
+    def touch(self, entry_index: int):
+        """A valid entry has been hit."""
+        pass
+
+    @abstractmethod
+    def remove(self, set_index: int, entry_index: int):
+        """A valid entry has been invalidated."""
+        pass
+
+    @abstractmethod
+    def victim(self, set_index: int) -> int:
+        """Pick the entry to evict from a full set and stop tracking it."""
+        pass
+
+
+class FIFOTLBPolicy(TLBReplacementPolicy):
+    name = "First In First Out"
+    tracksHits = False
+
+    def __init__(self, numSets: int, associativity: int):
+        super().__init__(numSets, associativity)
+        self.fillOrder = [OrderedDict() for _ in range(numSets)]  # valid entries per set, oldest first
+
+    def fill(self, set_index, entry_index):
+        self.fillOrder[set_index][entry_index] = None
+
+    def touch(self, entry_index):
+        pass
+
+    def remove(self, set_index, entry_index):
+        del self.fillOrder[set_index][entry_index]
+
+    def victim(self, set_index):
+        entry_index, _ = self.fillOrder[set_index].popitem(last=False)
+        return entry_index
+
+
+class LRUTLBPolicy(FIFOTLBPolicy):
+    name = "Least Recently Used"
+    tracksHits = True
+
+    def touch(self, entry_index):
+        self.fillOrder[entry_index // self.associativity].move_to_end(entry_index)
+
+
+class TreePLRUTLBPolicy(TLBReplacementPolicy):
+    """
+    Tree pseudo-LRU: a binary tree of associativity - 1 bits per set, each pointing towards the
+    half that was used less recently. Hits and victim selection walk one root-to-leaf path.
+    Requires a power-of-two associativity.
+    """
+    name = "tree pseudo-LRU"
+
+    def __init__(self, numSets: int, associativity: int):
+        if associativity & (associativity - 1):
+            raise ValueError("Tree pseudo-LRU needs a power-of-two associativity.")
+        super().__init__(numSets, associativity)
+        self.depth = associativity.bit_length() - 1
+        self.bits = bytearray(numSets * associativity)  # heap-ordered nodes 1 .. associativity - 1 per set
+
+    def touch(self, entry_index):
+        set_index, way = divmod(entry_index, self.associativity)
+        bits = self.bits
+        base = set_index * self.associativity
+        node = 1
+        for level in range(self.depth - 1, -1, -1):
+            right = (way >> level) & 1
+            bits[base + node] = right ^ 1  # point away from the way just used
+            node = 2 * node + right
+
+    def fill(self, set_index, entry_index):
+        self.touch(entry_index)
+
+    def remove(self, set_index, entry_index):
+        pass  # free ways are refilled before the tree is consulted
+
+    def victim(self, set_index):
+        bits = self.bits
+        base = set_index * self.associativity
+        node = 1
+        for _ in range(self.depth):
+            node = 2 * node + bits[base + node]
+        return base + node - self.associativity
+
+
+class RandomTLBPolicy(TLBReplacementPolicy):
+    name = "random"
+    tracksHits = False
+
+    def __init__(self, numSets: int, associativity: int, seed: int = 0):
+        super().__init__(numSets, associativity)
+        self.random = random.Random(seed)
+
+    def fill(self, set_index, entry_index):
+        pass
+
+    def touch(self, entry_index):
+        pass
+
+    def remove(self, set_index, entry_index):
+        pass
+
+    def victim(self, set_index):
+        return set_index * self.associativity + self.random.randrange(self.associativity)
+
+
+TLB_REPLACEMENT_POLICIES = {
+    "FIFO": FIFOTLBPolicy,
+    "LRU": LRUTLBPolicy,
+    "PLRU": TreePLRUTLBPolicy,
+    "Random": RandomTLBPolicy,
+}
+
 
 class TLB:
-    def __init__(self, tlbSize: int, associativity: int):
-        self.sets = {i: deque(maxlen=associativity) for i in range(tlbSize // associativity)}  # FIFO queues
-        self.full_sets = {i: [None] * associativity for i in range(tlbSize // associativity)}  # Fixed slots
+    def __init__(self, tlbSize: int, associativity: int, policy: str = "FIFO"):
+        if policy not in TLB_REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown TLB replacement policy: {policy}")
         self.associativity = associativity
+        self.tlbSize = tlbSize
+        self.numSets = tlbSize // associativity
+        self.entries = [None] * (self.numSets * associativity)  # global index = set * associativity + way
+        self.tagIndex = {}  # tag -> global index of its valid entry
+        self.policy = TLB_REPLACEMENT_POLICIES[policy](self.numSets, associativity)
+        self.touch = self.policy.touch if self.policy.tracksHits else None
+        self.freeWays = [list(range(associativity - 1, -1, -1)) for _ in range(self.numSets)]
+        self.lastEvicted = None  # entry pushed out by the latest check_and_add_entry, if any
+        self.onEntryChange = None  # called with the global index of every entry filled, updated or invalidated
         self.tlbHits = 0
         self.tlbMisses = 0
-        self.tlbSize = tlbSize
 
-    def check_and_add_entry(self, vpn: int, ppn: int) -> int:
+    def check_and_add_entry(self, vpn: int, ppn: int, set_index: Optional[int] = None, instruction: bool = False) -> int:
         """
-        Add or replace an entry in the appropriate TLB set using FIFO.
+        Add or replace an entry in the appropriate TLB set, evicting with the TLB's policy.
+        `set_index` can be passed when the caller has already computed it. A single TLB holds
+        instruction and data translations alike, so `instruction` is ignored.
         Returns the exact index of the newly added entry in the TLB.
         """
-        set_index = vpn % len(self.sets)
-        entry = TLBEntry(tag=vpn, physicalPageAddress=ppn)
+        self.lastEvicted = None
+        entry_index = self.tagIndex.get(vpn)
+        if entry_index is not None:
+            self.entries[entry_index].physicalPageAddress = ppn
+            self.policy.touch(entry_index)
+            if self.onEntryChange is not None:
+                self.onEntryChange(entry_index)
+            return entry_index
+
+        if set_index is None:
+            set_index = vpn % self.numSets
+        free_ways = self.freeWays[set_index]
+        if free_ways:
+            entry_index = set_index * self.associativity + free_ways.pop()  # Global index in TLB
+        else:
+            entry_index = self.policy.victim(set_index)
+            self.lastEvicted = self.entries[entry_index]
+            del self.tagIndex[self.lastEvicted.tag]
+
+        self.entries[entry_index] = TLBEntry(tag=vpn, physicalPageAddress=ppn)
+        self.tagIndex[vpn] = entry_index
+        self.policy.fill(set_index, entry_index)
+        if self.onEntryChange is not None:
+            self.onEntryChange(entry_index)
+        return entry_index
+
+    def lookup(self, vpn: int, instruction: bool = False):
+        """
+        Perform a TLB lookup; `instruction` is ignored, as in check_and_add_entry.
+        Returns the entry and its exact global index in the TLB.
+        """
+        entry_index = self.tagIndex.get(vpn)
+        if entry_index is None:
+            self.tlbMisses += 1
+            return [None, -1]
+
+        self.tlbHits += 1
+        if self.touch is not None:
+            self.touch(entry_index)
+        return [self.entries[entry_index], entry_index]
+
+    def invalidate_entry(self, tag: int):
+        """Invalidate the entry with the given tag and return its global index, or None if not cached."""
+        entry_index = self.tagIndex.pop(tag, None)
+        if entry_index is None:
+            return None
+
+        self.entries[entry_index].validBit = False
+        set_index, way = divmod(entry_index, self.associativity)
+        self.policy.remove(set_index, entry_index)
+        self.freeWays[set_index].append(way)
+        if self.onEntryChange is not None:
+            self.onEntryChange(entry_index)
+        return entry_index
+
+    def flush(self):
+        """Invalidate every entry, as on a context switch without ASIDs. Returns the number of entries dropped."""
+        tags = list(self.tagIndex)
+        for tag in tags:
+            self.invalidate_entry(tag)
+        return len(tags)
+
+    def level_stats(self):
+        return [{"level": "L1", "hits": self.tlbHits, "misses": self.tlbMisses}]
 
-        if len(self.sets[set_index]) >= self.associativity:
-            evicted_entry = self.sets[set_index].popleft()
-            self.full_sets[set_index][self.full_sets[set_index].index(evicted_entry)] = None
 
-        self.sets[set_index].append(entry)
-        entry_index = -1
-        for i in range(self.associativity):
-            if self.full_sets[set_index][i] is None:
-                self.full_sets[set_index][i] = entry
-                entry_index = i
-                break
+TLB_INCLUSION_POLICIES = ("inclusive", "exclusive")
+# On a context switch the TLB is either flushed or keeps its entries, told apart by ASID tags
+TLB_CONTEXT_MODES = ("asid", "flush")
 
-        return set_index * self.associativity + entry_index  # Global index in TLB
 
-    def lookup(self, vpn: int):
+class TLBHierarchy:
+    """
+    L1 TLBs backed by a shared L2 TLB. The L1 can be split into an instruction TLB and a data TLB.
+    Inclusive: every L1 entry is also in L2, and L2 evictions invalidate the L1 copy.
+    Exclusive: L2 only holds entries evicted from L1; an L2 hit moves the entry up to L1.
+    Exposes the TLB interface; entries, sets and policy are those of the L1 data TLB.
+    """
+
+    def __init__(self, tlbSize: int, associativity: int, l2Size: int, l2Associativity: int,
+                 inclusion: str = "inclusive", policy: str = "FIFO", itlbSize: int = 0):
+        if inclusion not in TLB_INCLUSION_POLICIES:
+            raise ValueError(f"Unknown TLB inclusion policy: {inclusion}")
+        self.inclusion = inclusion
+        self.l1d = TLB(tlbSize, associativity, policy)
+        self.l1i = TLB(itlbSize, min(associativity, itlbSize), policy) if itlbSize else None
+        self.l2 = TLB(l2Size, l2Associativity, policy) if l2Size else None
+        self.levels = [("L1i", self.l1i), ("L1d", self.l1d), ("L2", self.l2)]
+        self.levels = [(name, level) for name, level in self.levels if level is not None]
+
+        self.associativity = associativity
+        self.tlbSize = tlbSize
+        self.numSets = self.l1d.numSets
+        self.entries = self.l1d.entries
+        self.policy = self.l1d.policy
+        self.lastHitLevel = None  # name of the level that served the latest lookup hit
+        self.tlbHits = 0
+        self.tlbMisses = 0
+
+    def check_and_add_entry(self, vpn: int, ppn: int, set_index: Optional[int] = None, instruction: bool = False) -> int:
+        """
+        Fill a translation after a page walk. Returns the entry's index in the L1 TLB.
+        `set_index` is a set of the L1 data TLB, so instruction fills recompute theirs.
         """
-        Perform a TLB lookup.
-        Returns a dictionary with the entry and its exact global index in the TLB.
+        l1 = self.l1i if instruction and self.l1i else self.l1d
+        if l1 is not self.l1d:
+            set_index = None
+        if self.l2 is not None and self.inclusion == "inclusive":
+            self.l2.check_and_add_entry(vpn, ppn)
+            if self.l2.lastEvicted is not None:
+                self.back_invalidate(self.l2.lastEvicted.tag)
+        entry_index = l1.check_and_add_entry(vpn, ppn, set_index)
+        if self.l2 is not None and self.inclusion == "exclusive" and l1.lastEvicted is not None:
+            self.l2.check_and_add_entry(l1.lastEvicted.tag, l1.lastEvicted.physicalPageAddress)
+        return entry_index
+
+    def lookup(self, vpn: int, instruction: bool = False):
+        """
+        Look a VPN up level by level. An L2 hit is copied (inclusive) or moved (exclusive) into L1.
+        Returns the entry and its global index in the L1 TLB.
         """
-        set_index = vpn % len(self.sets)
-        for i, entry in enumerate(self.full_sets[set_index]):
-            if entry and entry.tag == vpn and entry.validBit:
+        l1 = self.l1i if instruction and self.l1i else self.l1d
+        entry, entry_index = l1.lookup(vpn)
+        if entry is not None:
+            self.tlbHits += 1
+            self.lastHitLevel = "L1i" if l1 is self.l1i else "L1d"
+            return [entry, entry_index]
+
+        if self.l2 is not None:
+            entry, _ = self.l2.lookup(vpn)
+            if entry is not None:
                 self.tlbHits += 1
-                global_index = set_index * self.associativity + i
-                return [entry, global_index]
+                self.lastHitLevel = "L2"
+                ppn = entry.physicalPageAddress
+                if self.inclusion == "exclusive":
+                    self.l2.invalidate_entry(vpn)
+                    entry_index = self.check_and_add_entry(vpn, ppn, instruction=instruction)
+                else:
+                    entry_index = l1.check_and_add_entry(vpn, ppn)
+                return [l1.entries[entry_index], entry_index]
 
         self.tlbMisses += 1
-        return [None,-1]
+        self.lastHitLevel = None
+        return [None, -1]
+
+    def back_invalidate(self, tag: int):
+        for _, level in self.levels:
+            if level is not self.l2:
+                level.invalidate_entry(tag)
 
     def invalidate_entry(self, tag: int):
-        """Invalidate an entry corresponding to the given tag."""
-        for set_index, entries in self.full_sets.items():
-            for i, entry in enumerate(entries):
-                if entry and entry.tag == tag:
-                    self.full_sets[set_index][i].validBit = False
-                    self.sets[set_index] = deque(
-                        [e for e in self.sets[set_index] if e.tag != tag],
-                        maxlen=self.associativity
-                    )
-                    return set_index * self.associativity + i
+        """
+        Invalidate a translation at every level. Returns its indices in the L1 data TLB and in the
+        L1 instruction TLB, each None where it was not cached.
+        """
+        entry_index = self.l1d.invalidate_entry(tag)
+        instruction_index = self.l1i.invalidate_entry(tag) if self.l1i is not None else None
+        if self.l2 is not None:
+            self.l2.invalidate_entry(tag)
+        return entry_index, instruction_index
+
+    def flush(self):
+        return sum(level.flush() for _, level in self.levels)
+
+    def level_stats(self):
+        """Hits and misses of every level; a level only sees the lookups that missed above it."""
+        return [{"level": name, "hits": level.tlbHits, "misses": level.tlbMisses} for name, level in self.levels]